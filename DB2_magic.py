@@ -48,7 +48,7 @@ get_ipython().magic(u'sql connect')
 # 
 # The CONNECT command has the following format:
 # <pre>
-# %sql CONNECT TO &lt;database&gt; USER &lt;userid&gt; USING &lt;password | ?&gt; HOST &lt;ip address&gt; PORT &lt;port number&gt;
+# %sql CONNECT TO &lt;database&gt; USER &lt;userid&gt; USING &lt;password | ?&gt; HOST &lt;ip address&gt; PORT &lt;port number&gt; [AS &lt;name&gt;]
 # </pre>
 # If you use a "?" for the password field, the system will prompt you for a password. This avoids typing the 
 # password as clear text on the screen. If a connection is not successful, the system will print the error
@@ -57,21 +57,43 @@ get_ipython().magic(u'sql connect')
 # If the connection is successful, the parameters are saved on your system and will be used the next time you
 # run a SQL statement, or when you issue the %sql CONNECT command with no parameters.
 # 
+# Connections stay open under a name (the database name unless you use AS &lt;name&gt;). CONNECT AS &lt;name&gt; switches
+# back to an open connection without reconnecting, and %sql -c &lt;name&gt; runs a single statement on it.
+# 
 # In addition to the -d option, there are a number different options that you can specify at the beginning of 
 # the SQL:
 # 
 # - -d - Delimiter: Change SQL delimiter to "@" from ";"
+# - -f file - File: Run the SQL script in the file one statement at a time as it is read and return the line, rows, elapsed time and error of each statement. Use -d or a "--#SET TERMINATOR" line for "@" delimited statements.
+# - -out file - Output: Write the answer set to a Parquet (.parquet), Feather/Arrow (.feather, .arrow) or CSV (.csv) file a batch at a time as it is fetched, so memory stays bounded, and report the rows, bytes and throughput. Parquet and Feather columns get the Arrow type of the Db2 column, with DECIMAL kept as decimal128 at its precision and scale. Parquet and Feather files need pyarrow.
 # - -q - Quiet: Quiet results - no answer set or messages returned from the function
+# - -load df table - Load: Load the DataFrame df into the table with array inserts, creating the table if needed. Settings: batch=N (rows per insert), commit=N (rows per commit), create=no.
 # - -n - No result set: Execute all of the SQL as commands rather than select statements (no answer sets) 
 # - -s - SQL: Execute everything as SELECT statements. By default, SELECT, VALUES, and WITH are considered part of an answer set, but it is possible that you have an SQL statement that does not start with any of these keywords but returns an answer set.
 # - -r - Return the result set as an array of values instead of a dataframe
+# - -r array - Return the result set as compact typed arrays, one NumPy array per column. Rows can be read as tuples (rows[0]), columns by name (rows["EMPNO"]) and to_pandas() creates a DataFrame without copying the data.
 # - -t - Time: Time the following SQL statement and return the number of times it executes in 1 second
-# - -j - JSON: Create a pretty JSON representation. Only the first column is formatted
-# - -a - All: Return all rows in answer set and do not limit display
-# - -pb - Plot Bar: Plot the results as a bar chart
-# - -pl - Plot Line: Plot the results as a line chart
-# - -pp - Plot Pie: Plot the results as a pie chart
-# - -sampledata - Create and load the EMPLOYEE and DEPARTMENT tables
+# - -j - JSON: Create a pretty JSON representation. Only the first column is formatted and only the first maxrows rows are displayed unless -a is used
+# - -j table - JSON Table: Flatten the JSON documents in the answer set into a DataFrame with one column per field (address.city). Columns that are not JSON, like JSON_VAL results, are returned as they are. Use path=field,field to keep only some fields.
+# - -a - All: Return all rows in answer set and do not limit display. Without this option only the rows that are displayed are fetched until the rest of the answer set is needed.
+# - -parallel N - Parallel: Run the statements of a %%sql cell on up to N connections at once and return a list of the results in statement order
+# - -tx [commit=N] - Transaction: Run the statements with autocommit off as one transaction, or commit every N statements with commit=N, and report the statements/sec. If a statement fails the statements since the last commit are rolled back and the rest of the cell is not run.
+# - -pb - Plot Bar: Plot the results as a bar chart. The values are summed by category in Db2 and only the top=N (default 20, 0 for all rows) largest are plotted with the rest as "Other"
+# - -pl - Plot Line: Plot the results as a line chart. At most points=N (default 1000, 0 for all rows) are plotted, averaged over equal x ranges in Db2 (method=bins) or picked with LTTB downsampling (method=lttb)
+# - -pp - Plot Pie: Plot the results as a pie chart. The values are summed by category in Db2 and only the top=N (default 10, 0 for all rows) largest are plotted with the rest as "Other"
+# - -bench - Benchmark: Benchmark the statement and return the throughput and p50/p95/p99/max latencies of the execute and fetch phases. Settings: workers=N (concurrent connections), runs=N (total executions, otherwise duration=seconds), warmup=N and mode=prepared|immediate|both.
+# - -bg - Background: Run the statement in the background and return a handle with the status, rows fetched, elapsed time, result() and cancel(). cancel() stops a statement that has not started and stops fetching after the current batch. A statement that is still executing is only stopped on the server if the user has SYSADM, SYSCTRL or SYSMAINT authority to force the application off.
+# - -c name - Connection: Run the statement on the connection called name (see CONNECT ... AS name)
+# - -fanout [targets=name,name] [timeout=seconds] - Fan-out: Run the statement at the same time on the saved connection profiles (every CONNECT ... AS name is saved, see db2_profiles()) and return the results in one DataFrame with a SOURCE column (SOURCE_ if the answer set already has a SOURCE column). Use targets=name,name to pick the profiles. A target that fails or takes longer than timeout=seconds (default 60) is left out and its error is shown as a warning and kept in df.attrs["errors"].
+# - -cache - Cache: Return the answer set from the result cache if it is there, otherwise run the statement and cache the results
+# - -incremental key [window=N] - Incremental: Remember the largest value of the key column (an identity, sequence or insert timestamp column that always increases) and on the next run of the same statement only fetch the newer rows and append them to the DataFrame from the last run. window=N keeps only the last N rows. %sql -incremental reset forgets the kept results.
+# - -chunk N - Chunk: Return a generator that fetches the answer set in DataFrames of N rows (lists of rows with -r, DB2Rows with -r array)
+# - -compare - Compare: Fetch the answer set with the native fetch engine and with pandas.read_sql and report the rows/sec of each
+# - -compact - Compact: Fetch all rows into a DataFrame with compact column types chosen from the Db2 column types and display the memory used by each column before and after. Integers use the smallest type (nullable when there are NULLs), REAL becomes float32, DATE and TIMESTAMP become datetime64, CHAR padding is removed and strings with few distinct values become categoricals (settings["category"], default 0.5 of the rows). DECIMAL stays float64 unless settings["decimal"] is "scaled", which stores it as an integer number of 10**-scale units.
+# - -stats - Statistics: Return the recent statements with their prepare, execute, first row, fetch, conversion and display times, rows, approximate bytes and errors (%sql -stats reset clears them). Use db2_stats_callback(function) to have each statement passed to your own function as it finishes.
+# - -explain - Explain: Explain the statement and return the access plan operators with their estimated costs and cardinalities, then run the statement and report the actual rows and runtime. Use execute=no to only explain the statement. A warning is shown when the estimated cost is over settings["costlimit"] (0 for no limit).
+# - -history - History: Return the runtime history of each statement (literals removed) kept in db2history.pickle across sessions. A warning is shown when a statement runs settings["slowfactor"] times (default 3) and settings["slowseconds"] (default 1) slower than its median.
+# - -sampledata - Create and load the EMPLOYEE and DEPARTMENT tables. SCALE=n generates n times as many rows, FACT=n adds a SALES_FACT table with n rows, SEED=n changes the generated data and REPLACE=YES recreates existing tables.
 # 
 # One final note. You can pass python variables to the %sql command by using the \{\} braces with the name of the
 # variable inbetween. Note that you will need to place proper punctuation around the variable in the event the
@@ -79,14 +101,29 @@ get_ipython().magic(u'sql connect')
 # <pre>
 # empno = '000010'
 # %sql SELECT LASTNAME FROM EMPLOYEE WHERE EMPNO='{empno}'
+# </pre>
+# You can also use a host variable by placing a colon in front of the variable name. The value is passed to Db2
+# as a parameter instead of being placed in the SQL text, so no quotes are required and the statement is only
+# prepared once no matter how many different values are used.
+# <pre>
+# %sql SELECT LASTNAME FROM EMPLOYEE WHERE EMPNO=:empno
+# </pre>
+# A host variable that holds a list, tuple, set, NumPy array or pandas Series is bound as an IN list. Lists with
+# up to 1000 values (the listsize setting) become parameter markers, padded to a power of two so only a few 
+# statements are prepared. Longer lists are inserted into a declared global temporary table that the IN list
+# reads from, so looking up 50,000 keys is one statement and one bulk insert. The temporary table needs a user
+# temporary table space.
+# <pre>
+# keys = df["EMPNO"]
+# %sql SELECT * FROM EMPLOYEE WHERE EMPNO IN (:keys)
 
 # ### Install Db2 Python Driver
-# In the event that you do not have ibm_db installed on your system, this command will attempt to load it for you. If the %sql command does not work, it may be that this library is failing. To review the error messages, remove the %%capture clause.
+# In the event that you do not have ibm_db installed on your system, this command will attempt to load it for you. It only runs pip the first time, when ibm_db cannot be found. If the %sql command does not work, it may be that this library is failing. To review the error messages, remove the %%capture clause. The pixiedust library is only needed for the -i option and can be installed with !pip install --user pixiedust.
 
 # In[1]:
 
 
-get_ipython().run_cell_magic(u'capture', u'', u'!pip install ibm_db\n!pip install --user --upgrade pixiedust')
+get_ipython().run_cell_magic(u'capture', u'', u'import importlib.util\nif importlib.util.find_spec("ibm_db") is None:\n    !pip install ibm_db')
 
 
 # ### Install Db2 Extensions
@@ -102,29 +139,87 @@ get_ipython().run_cell_magic(u'capture', u'', u'!pip install ibm_db\n!pip instal
 # Version 2017-11-15
 #
 
-import ibm_db
-import pandas
-import ibm_db_dbi
-import json
-import matplotlib.pyplot as plt
+import time
+loadStart = time.time()
+
 import getpass
+import hashlib
 import os
 import pickle
-import time
 import sys
 import re
+import collections
+import csv
+import datetime
+import decimal
+import importlib
+import threading
+import queue
+import concurrent.futures
 import warnings
 warnings.filterwarnings("ignore")
 
+# The Db2 driver, pandas, numpy and matplotlib take a long time to import, so they are only imported the 
+# first time they are used. importTimes records how many seconds each import took, including the time to
+# load this extension.
+
+importTimes = collections.OrderedDict()
+
+class DB2LazyModule(object):
+    
+    def __init__(self, name):
+        
+        self._name = name
+        self._module = None
+        
+    def _load(self):
+        
+        if self._module is None:
+            start = time.time()
+            self._module = importlib.import_module(self._name)
+            importTimes[self._name] = time.time() - start
+            
+        return self._module
+    
+    def __getattr__(self, attr):
+        
+        return getattr(self._load(), attr)
+    
+    def __repr__(self):
+        
+        return "<lazy module '{0}'{1}>".format(self._name, "" if self._module is None else " (loaded)")
+
+ibm_db = DB2LazyModule("ibm_db")
+ibm_db_dbi = DB2LazyModule("ibm_db_dbi")
+pandas = DB2LazyModule("pandas")
+numpy = DB2LazyModule("numpy")
+json = DB2LazyModule("json")
+plt = DB2LazyModule("matplotlib.pyplot")
+
+# The JSON parser used by the -j option. orjson or ujson is used when one is installed.
+
+fastjson = None
+
+def db2_fastjson():
+    
+    global fastjson
+    
+    if fastjson is None:
+        for name in ["orjson", "ujson", "json"]:
+            try:
+                fastjson = importlib.import_module(name)
+                break
+            except ImportError:
+                pass
+            
+    return fastjson
+
 # Override the name of display, HTML, and Image in the event you plan to use the pixiedust library for
 # rendering graphics.
 
 from IPython.display import HTML as pHTML, Image as pImage, display as pDisplay
-from __future__ import print_function
 from IPython.core.magic import (Magics, magics_class, line_magic,
                                 cell_magic, line_cell_magic)
-from pixiedust.display import *
-from pixiedust.utils.shellAccess import ShellAccess
 
 # Python Hack for Input between 2 and 3
 
@@ -133,8 +228,6 @@ try:
 except NameError: 
     pass 
 
-plt.style.use('ggplot')
-
 settings = {
      "maxrows"  : 10,    
      "database" : "",
@@ -142,7 +235,17 @@ settings = {
      "port"     : "50000",
      "protocol" : "TCPIP",    
      "uid"      : "DB2INST1",
-     "pwd"      : "password"
+     "pwd"      : "password",
+     "cache"    : False,
+     "cachemb"  : 256,
+     "cachettl" : 300,
+     "history"  : True,
+     "slowfactor" : 3.0,
+     "slowseconds" : 1.0,
+     "costlimit" : 0,
+     "decimal"  : "float",
+     "category" : 0.5,
+     "profiles" : {}
 }
 
 # Connection settings for statements 
@@ -152,6 +255,49 @@ hdbc = None
 hstmt = None
 runtime = 1
 
+# Named connections and the connection pool. poolsize is the maximum number of open connections, poolcheck
+# is the number of idle seconds before a connection is checked before it is used, and poolkeepalive is how
+# often idle pooled connections are pinged so they are not dropped by the server or a firewall. When every
+# connection is in use a request waits up to pooltimeout seconds for one to be given back.
+
+connections = {}
+currentConnection = None
+connectionPool = None
+poolsize = 8
+poolcheck = 60
+poolkeepalive = 300
+pooltimeout = 30
+
+# Fetch engine settings: number of rows retrieved from Db2 per batch, and the throughput of the last fetch
+
+fetchsize = 10000
+lastFetch = {}
+
+# Prefetch settings: the number of batches a background thread fetches ahead while the previous batches 
+# are converted (0 fetches and converts in turn), and the rows Db2 sends in each network block through the
+# BlockForNRows CLI keyword (0 leaves the driver default)
+
+prefetchdepth = 2
+blockrows = 0
+
+# Prepared statement cache: maximum number of prepared statements kept for each connection
+
+stmtcachesize = 32
+stmtCaches = {}
+
+# Bulk load settings: rows inserted per array insert, and rows inserted between commits
+
+loadbatch = 5000
+loadcommit = 100000
+
+# Result cache (see the cache, cachemb and cachettl settings)
+
+resultCache = None
+
+# Incremental results for -incremental: the answer set and the largest key value of each statement
+
+incrementalResults = {}
+
 def sqlhelp():
     
     sd = '<td style="text-align:left;">'
@@ -174,10 +320,22 @@ def sqlhelp():
           {sd}d{ed}
           {sd}Change SQL delimiter to "@" from ";"{ed}
         {er}
+        {sr}
+          {sd}f file{ed}
+          {sd}Run the SQL script in the file one statement at a time as it is read and return the line, rows, elapsed time and error of each statement. Use -d or a "--#SET TERMINATOR" line for "@" delimited statements.{ed}
+        {er}
+        {sr}
+          {sd}out file{ed}
+          {sd}Write the answer set to a Parquet (.parquet), Feather/Arrow (.feather, .arrow) or CSV (.csv) file a batch at a time as it is fetched, so memory stays bounded, and report the rows, bytes and throughput. Parquet and Feather columns get the Arrow type of the Db2 column, with DECIMAL kept as decimal128 at its precision and scale. Parquet and Feather files need pyarrow.{ed}
+        {er}
         {sr}
           {sd}q{ed}
           {sd}Quiet results - no answer set or messages returned from the function{ed}
         {er}
+        {sr}
+          {sd}load df table{ed}
+          {sd}Load the DataFrame df into the table with array inserts, creating the table if needed. Settings: batch=N (rows per insert), commit=N (rows per commit), create=no.{ed}
+        {er}
         {sr}
           {sd}n{ed}
           {sd}Execute all of the SQL as commands rather than select statements (no answer sets){ed}
@@ -191,37 +349,101 @@ def sqlhelp():
           {sd}r{ed}
           {sd}Return the result set as an array of values{ed}
         {er}
+        {sr}  
+          {sd}r array{ed}
+          {sd}Return the result set as compact typed arrays, one NumPy array per column. Rows can be read as tuples (rows[0]), columns by name (rows["EMPNO"]) and to_pandas() creates a DataFrame without copying the data.{ed}
+        {er}
         {sr}
           {sd}t{ed}
           {sd}Time the following SQL statement and return the number of times it executes in 1 second{ed}
         {er}
         {sr}
           {sd}j{ed}
-          {sd}Create a pretty JSON representation. Only the first column is formatted{ed}
+          {sd}Create a pretty JSON representation. Only the first column is formatted and only the first maxrows rows are displayed unless -a is used{ed}
+        {er}
+        {sr}
+          {sd}j table{ed}
+          {sd}Flatten the JSON documents in the answer set into a DataFrame with one column per field (address.city). Columns that are not JSON, like JSON_VAL results, are returned as they are. Use path=field,field to keep only some fields.{ed}
         {er}
         {sr}
           {sd}a{ed}
-          {sd}Return all rows in answer set and do not limit display{ed}
+          {sd}Return all rows in answer set and do not limit display. Without this option only the rows that are displayed are fetched until the rest of the answer set is needed.{ed}
         {er}
         {sr}
           {sd}i{ed}
           {sd}Return the data in a pixiedust display to view the data and optionally plot it.{ed}
         {er}
+        {sr}
+          {sd}parallel N{ed}
+          {sd}Run the statements of a %%sql cell on up to N connections at once and return a list of the results in statement order{ed}
+        {er}
+        {sr}
+          {sd}tx [commit=N]{ed}
+          {sd}Run the statements with autocommit off as one transaction, or commit every N statements with commit=N, and report the statements/sec. If a statement fails the statements since the last commit are rolled back and the rest of the cell is not run.{ed}
+        {er}
         {sr}
           {sd}pb{ed}
-          {sd}Plot the results as a bar chart{ed}
+          {sd}Plot the results as a bar chart. The values are summed by category in Db2 and only the top=N (default 20, 0 for all rows) largest are plotted with the rest as "Other"{ed}
         {er}
         {sr}
           {sd}pl{ed}
-          {sd}Plot the results as a line chart{ed}
+          {sd}Plot the results as a line chart. At most points=N (default 1000, 0 for all rows) are plotted, averaged over equal x ranges in Db2 (method=bins) or picked with LTTB downsampling (method=lttb){ed}
         {er}
         {sr}
           {sd}pp{ed}
-          {sd}Plot Pie: Plot the results as a pie chart{ed}
+          {sd}Plot Pie: Plot the results as a pie chart. The values are summed by category in Db2 and only the top=N (default 10, 0 for all rows) largest are plotted with the rest as "Other"{ed}
+        {er}
+        {sr}
+          {sd}bench{ed}
+          {sd}Benchmark the statement and return the throughput and p50/p95/p99/max latencies of the execute and fetch phases. Settings: workers=N (concurrent connections), runs=N (total executions, otherwise duration=seconds), warmup=N and mode=prepared|immediate|both.{ed}
+        {er}
+        {sr}
+          {sd}bg{ed}
+          {sd}Run the statement in the background and return a handle with the status, rows fetched, elapsed time, result() and cancel(). cancel() stops a statement that has not started and stops fetching after the current batch. A statement that is still executing is only stopped on the server if the user has SYSADM, SYSCTRL or SYSMAINT authority to force the application off.{ed}
+        {er}
+        {sr}
+          {sd}c name{ed}
+          {sd}Run the statement on the connection called name (see CONNECT ... AS name){ed}
+        {er}
+        {sr}
+          {sd}fanout [targets=name,name] [timeout=seconds]{ed}
+          {sd}Run the statement at the same time on the saved connection profiles (every CONNECT ... AS name is saved, see db2_profiles()) and return the results in one DataFrame with a SOURCE column (SOURCE_ if the answer set already has a SOURCE column). Use targets=name,name to pick the profiles. A target that fails or takes longer than timeout=seconds (default 60) is left out and its error is shown as a warning and kept in df.attrs["errors"].{ed}
+        {er}
+        {sr}
+          {sd}cache{ed}
+          {sd}Return the answer set from the result cache if it is there, otherwise run the statement and cache the results{ed}
+        {er}
+        {sr}
+          {sd}incremental key [window=N]{ed}
+          {sd}Remember the largest value of the key column (an identity, sequence or insert timestamp column that always increases) and on the next run of the same statement only fetch the newer rows and append them to the DataFrame from the last run. window=N keeps only the last N rows. %sql -incremental reset forgets the kept results.{ed}
+        {er}
+        {sr}
+          {sd}chunk N{ed}
+          {sd}Return a generator that fetches the answer set in DataFrames of N rows (lists of rows with -r, DB2Rows with -r array){ed}
+        {er}
+        {sr}
+          {sd}compare{ed}
+          {sd}Fetch the answer set with the native fetch engine and with pandas.read_sql and report the rows/sec of each{ed}
+        {er}
+        {sr}
+          {sd}compact{ed}
+          {sd}Fetch all rows into a DataFrame with compact column types chosen from the Db2 column types and display the memory used by each column before and after. Integers use the smallest type (nullable when there are NULLs), REAL becomes float32, DATE and TIMESTAMP become datetime64, CHAR padding is removed and strings with few distinct values become categoricals (settings["category"], default 0.5 of the rows). DECIMAL stays float64 unless settings["decimal"] is "scaled", which stores it as an integer number of 10**-scale units.{ed}
+        {er}
+        {sr}
+          {sd}stats{ed}
+          {sd}Return the recent statements with their prepare, execute, first row, fetch, conversion and display times, rows, approximate bytes and errors (%sql -stats reset clears them). Use db2_stats_callback(function) to have each statement passed to your own function as it finishes.{ed}
+        {er}
+        {sr}
+          {sd}explain{ed}
+          {sd}Explain the statement and return the access plan operators with their estimated costs and cardinalities, then run the statement and report the actual rows and runtime. Use execute=no to only explain the statement. A warning is shown when the estimated cost is over settings["costlimit"] (0 for no limit).{ed}
+        {er}
+        {sr}
+          {sd}history{ed}
+          {sd}Return the runtime history of each statement (literals removed) kept in db2history.pickle across sessions. A warning is shown when a statement runs settings["slowfactor"] times (default 3) and settings["slowseconds"] (default 1) slower than its median.{ed}
         {er}
         {sr}
           {sd}sampledata{ed}
-          {sd}Create and load the EMPLOYEE and DEPARTMENT tables{ed}
+          {sd}Create and load the EMPLOYEE and DEPARTMENT tables. SCALE=n generates n times as many rows, FACT=n adds a SALES_FACT table with n rows, SEED=n changes the generated data and REPLACE=YES recreates existing tables.{ed}
         {er}
        </table>
        """
@@ -243,7 +465,7 @@ def connected_help():
        <h3>Connecting to DB2</h3> 
        <p>The CONNECT command has the following format:
        <pre>
-       %sql CONNECT TO &lt;database&gt; USER &lt;userid&gt; USING &lt;password|?&gt; HOST &lt;ip address&gt; PORT &lt;port number&gt;
+       %sql CONNECT TO &lt;database&gt; USER &lt;userid&gt; USING &lt;password|?&gt; HOST &lt;ip address&gt; PORT &lt;port number&gt; [AS &lt;name&gt;]
        </pre>
        If you use a "?" for the password field, the system will prompt you for a password. This avoids typing the 
        password as clear text on the screen. If a connection is not successful, the system will print the error
@@ -255,6 +477,9 @@ def connected_help():
        <p>
        If the connection is successful, the parameters are saved on your system and will be used the next time you
        run an SQL statement, or when you issue the %sql CONNECT command with no parameters.
+       <p>Every connection is kept open under a name (the database name unless you use AS &lt;name&gt;), so 
+       you can switch back to an earlier connection with CONNECT AS &lt;name&gt; without reconnecting, or run 
+       a single statement on it with %sql -c &lt;name&gt; SELECT ... 
        <p>If you issue CONNECT RESET, all of the current values will be deleted and you will need to 
        issue a new CONNECT statement. 
        <p>CONNECT without any parameters will cause the program to prompt you for
@@ -329,7 +554,7 @@ def load_settings():
 
     try:
         with open(fname,'rb') as f: 
-            settings = pickle.load(f) 
+            settings.update(pickle.load(f))
             
     except: 
         pass
@@ -455,6 +680,171 @@ def db2_create_sample():
     
     success("Sample tables [EMPLOYEE, DEPARTMENT] created.")
     
+# Values used to generate sample data that looks like the EMPLOYEE and DEPARTMENT tables
+
+sampleFirstNames = ["CHRISTINE", "MICHAEL", "SALLY", "JOHN", "IRVING", "EVA", "EILEEN", "THEODORE", "VINCENZO", "SEAN", 
+                    "DELORES", "HEATHER", "BRUCE", "ELIZABETH", "MASATOSHI", "MARILYN", "JAMES", "DAVID", "WILLIAM", 
+                    "JENNIFER", "SALVATORE", "DANIEL", "SYBIL", "MARIA", "ETHEL", "PHILIP", "MAUDE", "RAMLAL", "WING", 
+                    "JASON", "DIAN", "GREG", "KIM", "KIYOSHI", "REBA", "ROBERT", "MICHELLE", "HELENA", "ROY"]
+sampleLastNames  = ["HAAS", "THOMPSON", "KWAN", "GEYER", "STERN", "PULASKI", "HENDERSON", "SPENSER", "LUCCHESSI", 
+                    "O`CONNELL", "QUINTANA", "NICHOLLS", "ADAMSON", "PIANKA", "YOSHIMURA", "SCOUTTEN", "WALKER", "BROWN", 
+                    "JONES", "LUTZ", "JEFFERSON", "MARINO", "SMITH", "JOHNSON", "PEREZ", "SCHNEIDER", "PARKER", 
+                    "SETRIGHT", "MEHTA", "LEE", "GOUNOT", "HEMMINGER", "ORLANDO", "NATZ", "YAMAMOTO", "JOHN", 
+                    "MONTEVERDE", "SCHWARTZ", "SPRINGER", "WONG", "ALONZO"]
+sampleJobs       = ["PRES", "MANAGER", "SALESREP", "CLERK", "ANALYST", "DESIGNER", "OPERATOR", "FIELDREP"]
+sampleSalary     = [150000, 85000, 55000, 40000, 70000, 55000, 38000, 42000]
+sampleDeptNames  = ["PLANNING", "INFORMATION CENTER", "DEVELOPMENT CENTER", "MANUFACTURING SYSTEMS", "ADMINISTRATION SYSTEMS",
+                    "SUPPORT SERVICES", "OPERATIONS", "SOFTWARE SUPPORT", "BRANCH OFFICE", "SALES", "MARKETING", "FINANCE"]
+sampleRegions    = ["NORTH", "SOUTH", "EAST", "WEST", "CENTRAL"]
+
+# Random number generator for one chunk of generated rows. Each chunk has its own seed so the data does
+# not depend on how much was generated before it.
+
+def db2_sample_rng(seed, table, chunk):
+    
+    return numpy.random.default_rng([seed, sum(ord(ch) for ch in table), chunk])
+
+# Department numbers are a letter followed by digits (A00, B01, ...) and employee numbers are zero padded
+
+def db2_sample_deptno(ids, width):
+    
+    letters = numpy.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    digits = numpy.char.zfill((ids // 26).astype(str), width - 1)
+    
+    return numpy.char.add(letters[ids % 26], digits)
+
+def db2_sample_empno(ids, width):
+    
+    return numpy.char.zfill(ids.astype(str), width)
+
+# Random dates between two years, returned as Db2 date strings
+
+def db2_sample_dates(rng, size, first, last):
+    
+    start = numpy.datetime64(str(first) + "-01-01")
+    days = (numpy.datetime64(str(last) + "-12-31") - start).astype(int)
+    
+    return (start + rng.integers(0, days, size)).astype(str)
+
+# Generate one chunk of rows for a sample table
+
+def db2_sample_chunk(table, seed, chunk, first, size, employees, departments, widths):
+    
+    rng = db2_sample_rng(seed, table, chunk)
+    ids = numpy.arange(first, first + size)
+    
+    if table == "DEPARTMENT":
+        mgr = db2_sample_empno(rng.integers(0, employees, size), widths["empno"]).astype(object)
+        mgr[rng.random(size) < 0.1] = None
+        return pandas.DataFrame({
+            "DEPTNO"   : db2_sample_deptno(ids, widths["deptno"]),
+            "DEPTNAME" : numpy.char.add(numpy.char.add(numpy.array(sampleDeptNames)[rng.integers(0, len(sampleDeptNames), size)], " "), ids.astype(str)),
+            "MGRNO"    : mgr,
+            "ADMRDEPT" : db2_sample_deptno(ids // 5, widths["deptno"])
+        })
+    
+    if table == "EMPLOYEE":
+        job = rng.integers(0, len(sampleJobs), size)
+        salary = numpy.round(numpy.array(sampleSalary)[job] * rng.uniform(0.7, 1.3, size), 2)
+        hiredate = db2_sample_dates(rng, size, 1975, 2010)
+        birth = numpy.datetime64("1945-01-01") + rng.integers(0, 365 * 45, size)
+        return pandas.DataFrame({
+            "EMPNO"     : db2_sample_empno(ids, widths["empno"]),
+            "FIRSTNME"  : numpy.array(sampleFirstNames)[rng.integers(0, len(sampleFirstNames), size)],
+            "MIDINIT"   : numpy.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ "))[rng.integers(0, 27, size)],
+            "LASTNAME"  : numpy.array(sampleLastNames)[rng.integers(0, len(sampleLastNames), size)],
+            "WORKDEPT"  : db2_sample_deptno(rng.integers(0, departments, size), widths["deptno"]),
+            "PHONENO"   : numpy.char.zfill(rng.integers(0, 10000, size).astype(str), 4),
+            "HIREDATE"  : hiredate,
+            "JOB"       : numpy.array(sampleJobs)[job],
+            "EDLEVEL"   : rng.integers(12, 21, size).astype(numpy.int16),
+            "SEX"       : numpy.where(rng.random(size) < 0.5, "M", "F"),
+            "BIRTHDATE" : birth.astype(str),
+            "SALARY"    : salary,
+            "BONUS"     : numpy.round(salary * rng.uniform(0.0, 0.02, size), -2),
+            "COMM"      : numpy.round(salary * rng.uniform(0.01, 0.05, size), 2)
+        })
+    
+    quantity = rng.integers(1, 100, size)
+    price = numpy.round(rng.lognormal(3.0, 1.0, size), 2)
+    amount = numpy.round(quantity * price, 2)
+    data = {
+        "SALE_ID"    : ids.astype(numpy.int64),
+        "SALE_DATE"  : db2_sample_dates(rng, size, 2010, 2017),
+        "EMPNO"      : db2_sample_empno(rng.integers(0, employees, size), widths["empno"]),
+        "WORKDEPT"   : db2_sample_deptno(rng.integers(0, departments, size), widths["deptno"]),
+        "REGION"     : numpy.array(sampleRegions)[rng.integers(0, len(sampleRegions), size)],
+        "PRODUCT_ID" : rng.zipf(1.5, size) % 10000,
+        "CUSTOMER_ID": rng.integers(0, max(1000, size), size),
+        "QUANTITY"   : quantity,
+        "UNIT_PRICE" : price,
+        "AMOUNT"     : amount,
+        "DISCOUNT"   : numpy.round(amount * rng.choice([0.0, 0.05, 0.1, 0.2], size), 2),
+        "TAX"        : numpy.round(amount * 0.13, 2),
+        "CHANNEL"    : numpy.where(rng.random(size) < 0.6, "STORE", "ONLINE")
+    }
+    for measure in range(1, 11):
+        data["MEASURE" + str(measure).zfill(2)] = rng.normal(100.0, 25.0, size)
+        
+    return pandas.DataFrame(data)
+
+# Table definitions for the generated sample data. The key columns are wide enough for the scale.
+
+def db2_sample_ddl(table, widths):
+    
+    if table == "DEPARTMENT":
+        return """CREATE TABLE DEPARTMENT(DEPTNO CHAR({deptno}) NOT NULL, DEPTNAME VARCHAR(36) NOT NULL, 
+                  MGRNO CHAR({empno}), ADMRDEPT CHAR({deptno}) NOT NULL)""".format(**widths)
+    
+    if table == "EMPLOYEE":
+        return """CREATE TABLE EMPLOYEE(EMPNO CHAR({empno}) NOT NULL, FIRSTNME VARCHAR(12) NOT NULL, MIDINIT CHAR(1),
+                  LASTNAME VARCHAR(15) NOT NULL, WORKDEPT CHAR({deptno}), PHONENO CHAR(4), HIREDATE DATE, JOB CHAR(8),
+                  EDLEVEL SMALLINT NOT NULL, SEX CHAR(1), BIRTHDATE DATE, SALARY DECIMAL(9,2), BONUS DECIMAL(9,2),
+                  COMM DECIMAL(9,2))""".format(**widths)
+    
+    measures = ", ".join("MEASURE" + str(measure).zfill(2) + " DOUBLE" for measure in range(1, 11))
+    return """CREATE TABLE SALES_FACT(SALE_ID BIGINT NOT NULL, SALE_DATE DATE NOT NULL, EMPNO CHAR({empno}), 
+              WORKDEPT CHAR({deptno}), REGION VARCHAR(10), PRODUCT_ID INTEGER, CUSTOMER_ID INTEGER, QUANTITY INTEGER,
+              UNIT_PRICE DECIMAL(11,2), AMOUNT DECIMAL(13,2), DISCOUNT DECIMAL(13,2), TAX DECIMAL(13,2), 
+              CHANNEL VARCHAR(6), {measures})""".format(measures=measures, **widths)
+
+# Generate the EMPLOYEE and DEPARTMENT tables at any scale. SCALE=1 has the same number of rows as the 
+# regular sample tables (42 employees and 14 departments). A SALES_FACT table with "fact" rows can also be
+# created. The data only depends on the seed. Rows are generated and loaded in chunks so that memory use
+# stays the same no matter how large the tables are.
+
+def db2_generate_sample(scale=1, seed=2017, fact=0, replace=False, chunksize=100000):
+    
+    global hdbc
+    
+    employees = 42 * scale
+    departments = 14 * scale
+    widths = {
+        "empno"  : max(6, len(str(employees))),
+        "deptno" : max(3, len(str(departments // 26)) + 1)
+    }
+    
+    tables = [("DEPARTMENT", departments), ("EMPLOYEE", employees)]
+    if fact > 0: tables.append(("SALES_FACT", fact))
+    
+    start = time.time()
+    total = 0
+    for table, rows in tables:
+        if db2_table_exists(table):
+            if replace == False:
+                success(table + " already exists. Use REPLACE=YES to generate it again.")
+                continue
+            db2_exec_once("DROP TABLE " + table, None, hdbc)
+        db2_exec_once(db2_sample_ddl(table, widths), None, hdbc)
+        
+        for chunk, first in enumerate(range(0, rows, chunksize)):
+            df = db2_sample_chunk(table, seed, chunk, first, min(chunksize, rows - first), employees, departments, widths)
+            total = total + db2_load(df, table, create=False, quiet=True)
+            
+    elapsed = time.time() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    success("{0} sample rows generated in {1:.2f} seconds ({2:,.0f} rows/sec).".format(total, elapsed, rate))
+    
 def connected_prompt():
     
     global settings
@@ -471,18 +861,15 @@ def connected_prompt():
     settings["maxrows"]  = input("Maximum rows displayed [10]: ") or "10";
     settings["maxrows"]  = int(settings["maxrows"])
 
-# Connect to DB2 and prompt if you haven't set any of the values yet
+# Settings that identify a connection
 
-def db2_doConnect():
-    
-    global hdbc, hstmt, connected, runtime
-    global settings  
+connectKeys = ["database", "hostname", "port", "protocol", "uid", "pwd"]
 
-    if connected == False: 
-        
-        if len(settings["database"]) == 0:
-            connected_help()
-            connected_prompt()
+# Build the connection string for a set of connection settings
+
+def db2_dsn(parms):
+    
+    global blockrows
     
     dsn = (
            "DRIVER={{IBM DB2 ODBC DRIVER}};"
@@ -491,12 +878,308 @@ def db2_doConnect():
            "PORT={2};"
            "PROTOCOL=TCPIP;"
            "UID={3};"
-           "PWD={4};").format(settings["database"], settings["hostname"], settings["port"], settings["uid"], settings["pwd"])
+           "PWD={4};").format(parms["database"], parms["hostname"], parms["port"], parms["uid"], parms["pwd"])
+    
+    if blockrows > 0: dsn = dsn + "BlockForNRows={0};".format(blockrows)
+    
+    return dsn
+
+# Check that a connection is still usable by running a trivial statement against it
+
+def db2_healthy(conn):
+    
+    try:
+        if not ibm_db.active(conn): return False
+        stmt = ibm_db.exec_immediate(conn, "VALUES 1")
+        ibm_db.free_result(stmt)
+        return True
+    except Exception:
+        return False
+    
+# Check if the last error was caused by a lost connection (SQLSTATE class 08 or a communication error)
+
+def db2_connection_lost(conn):
+    
+    try:
+        if not ibm_db.active(conn): return True
+    except Exception:
+        return True
+    
+    try:
+        state = ibm_db.stmt_error() or ibm_db.conn_error()
+        message = ibm_db.stmt_errormsg() or ""
+    except Exception:
+        return False
+    
+    if str(state).startswith("08"): return True
+    for code in ["SQL30081N", "SQL30108N", "SQL1224N", "SQL30080N", "SQL1776N"]:
+        if message.find(code) >= 0: return True
+        
+    return False
+
+# A pool of open Db2 connections. Connections are kept per connection string and handed out again when
+# the same database is needed, so switching between databases, or getting a second connection for 
+# concurrent work, does not require a new connect. 
+
+class DB2ConnectionPool(object):
+    
+    def __init__(self, maxsize, check, keepalive, timeout=30):
+        
+        self.maxsize = maxsize
+        self.check = check
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.idle = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.thread = None
+        
+    def acquire(self, dsn):
+        
+        deadline = time.time() + self.timeout
+        while True:
+            with self.lock:
+                conns = self.idle.get(dsn)
+                if conns:
+                    conn, used = conns.pop()
+                    if len(conns) == 0: del self.idle[dsn]
+                else:
+                    conn = None
+                    self._reserve(deadline)
+                    
+            if conn is None:
+                try:
+                    return ibm_db.connect(dsn, "", "")
+                except Exception:
+                    self._free()
+                    raise
+                
+            if time.time() - used < self.check or db2_healthy(conn):
+                return conn
+            
+            self.discard(conn)
+            
+    # Make room for a new connection, closing the least recently used idle connection if the pool is full.
+    # If every connection is in use, wait until one is released or discarded. Called with the lock held.
+    
+    def _reserve(self, deadline):
+        
+        while self.size >= self.maxsize:
+            for dsn in list(self.idle.keys()):
+                conns = self.idle[dsn]
+                conn, used = conns.pop(0)
+                if len(conns) == 0: del self.idle[dsn]
+                db2_close(conn)
+                self.size = self.size - 1
+                break
+            if self.size < self.maxsize: break
+            
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise Exception("The connection pool is full ({0} connections are in use). Increase poolsize to "
+                                "allow more connections.".format(self.maxsize))
+            self.available.wait(remaining)
+            
+        self.size = self.size + 1
+        
+    # Give up a connection slot and wake up a request that is waiting for one
+    
+    def _free(self):
+        
+        with self.lock:
+            self.size = self.size - 1
+            self.available.notify()
+            
+    def release(self, dsn, conn):
+        
+        try:
+            healthy = ibm_db.active(conn)
+            if healthy: ibm_db.rollback(conn)
+        except Exception:
+            healthy = False
+            
+        if not healthy:
+            self.discard(conn)
+            return
+        
+        with self.lock:
+            self.idle.setdefault(dsn, []).append((conn, time.time()))
+            self.idle.move_to_end(dsn)
+            self.available.notify()
+            
+        self._start()
+        
+    def discard(self, conn):
+        
+        db2_close(conn)
+        self._free()
+            
+    # Ping idle connections in the background so they stay open
+            
+    def _start(self):
+        
+        if self.thread is None and self.keepalive > 0:
+            self.thread = threading.Thread(target=self._keepalive, name="db2-keepalive")
+            self.thread.daemon = True
+            self.thread.start()
+            
+    def _keepalive(self):
+        
+        while True:
+            time.sleep(self.keepalive)
+            with self.lock:
+                idle = self.idle
+                self.idle = collections.OrderedDict()
+            for dsn, conns in idle.items():
+                for conn, used in conns:
+                    if time.time() - used < self.keepalive or db2_healthy(conn):
+                        with self.lock:
+                            self.idle.setdefault(dsn, []).append((conn, used))
+                            self.available.notify()
+                    else:
+                        self.discard(conn)
+                        
+    def close(self):
+        
+        with self.lock:
+            idle = self.idle
+            self.idle = collections.OrderedDict()
+        for conns in idle.values():
+            for conn, used in conns:
+                self.discard(conn)
+                
+# Close a connection and drop its prepared statements
+
+def db2_close(conn):
+    
+    db2_statement_cache_reset(conn)
+    try:
+        ibm_db.close(conn)
+    except Exception:
+        pass
+
+# Return the connection pool, creating it the first time it is needed
+
+def db2_pool():
+    
+    global connectionPool, poolsize, poolcheck, poolkeepalive, pooltimeout
+    
+    if connectionPool is None:
+        connectionPool = DB2ConnectionPool(poolsize, poolcheck, poolkeepalive, pooltimeout)
+        
+    return connectionPool
+
+# Make a named connection the current one. The connection is checked if it has been idle for a while
+# and reconnected if it is no longer usable.
+
+def db2_switch(name):
+    
+    global hdbc, hstmt, connected, currentConnection, connections, settings, poolcheck
+    
+    entry = connections[name]
+    if time.time() - entry["used"] >= poolcheck and not db2_healthy(entry["hdbc"]):
+        if db2_reconnect(entry["hdbc"]) is None: return False
+        
+    entry["used"] = time.time()
+    hdbc = entry["hdbc"]
+    hstmt = entry["hstmt"]
+    currentConnection = name
+    connected = True
+    for key in connectKeys: settings[key] = entry["settings"][key]
+        
+    return True
+
+# Replace a lost connection with a new one from the pool. Every name that uses the connection is updated.
+
+def db2_reconnect(conn):
+    
+    global hdbc, hstmt, connections
+    
+    names = [name for name, entry in connections.items() if entry["hdbc"] is conn]
+    if len(names) == 0: return None
+    
+    pool = db2_pool()
+    pool.discard(conn)
+    
+    newconn = None
+    for name, entry in connections.items():
+        if entry["hdbc"] is not conn: continue
+        if newconn is None:
+            try:
+                newconn = pool.acquire(entry["dsn"])
+            except Exception as err:
+                errormsg(str(err))
+                return None
+            newhstmt = ibm_db_dbi.Connection(newconn)
+        entry["hdbc"] = newconn
+        entry["hstmt"] = newhstmt
+        
+    if hdbc is conn and newconn is not None:
+        hdbc = newconn
+        hstmt = newhstmt
+        
+    return newconn
+
+# Give the connection used by a name back to the pool and forget the name
+
+def db2_disconnect(name):
+    
+    global connections
+    
+    entry = connections.pop(name, None)
+    if entry is None: return
+    
+    for other in connections.values():
+        if other["hdbc"] is entry["hdbc"]: return
+        
+    db2_pool().release(entry["dsn"], entry["hdbc"])
+    
+# List the named connections
+
+def db2_connections():
+    
+    global connections, currentConnection
+    
+    rows = []
+    for name, entry in connections.items():
+        rows.append([name, entry["settings"]["database"], entry["settings"]["hostname"], entry["settings"]["port"],
+                     entry["settings"]["uid"], name == currentConnection])
+        
+    return pandas.DataFrame(rows, columns=["NAME", "DATABASE", "HOSTNAME", "PORT", "UID", "CURRENT"])
+
+# Connect to DB2 and prompt if you haven't set any of the values yet. The connection is registered under
+# a name (the database name unless AS was used) and is reused if it is already open.
+
+def db2_doConnect(name=None):
+    
+    global hdbc, hstmt, connected, runtime
+    global settings, connections
+
+    if connected == False: 
+        
+        if len(settings["database"]) == 0:
+            connected_help()
+            connected_prompt()
+            
+    if name == None: name = settings["database"]
+    
+    dsn = db2_dsn(settings)
+    
+    entry = connections.get(name)
+    if entry != None and entry["dsn"] == dsn:
+        if db2_switch(name) == False:
+            connected = False
+            return
+        success("Connection successful.")
+        return
+    
+    if entry != None: db2_disconnect(name)
 
     # Get a database handle (hdbc) and a statement handle (hstmt) for subsequent access to DB2
 
     try:
-        hdbc  = ibm_db.connect(dsn, "", "")
+        conn = db2_pool().acquire(dsn)
     except Exception as err:
         errormsg(str(err))
         connected = False
@@ -504,36 +1187,50 @@ def db2_doConnect():
         return
     
     try:
-        hstmt = ibm_db_dbi.Connection(hdbc)
+        dbi = ibm_db_dbi.Connection(conn)
     except Exception as err:
         errormsg(str(err))
+        db2_pool().release(dsn, conn)
         connected = False
         settings["database"] = ''
         return        
     
-    connected = True
+    connections[name] = {
+        "dsn"      : dsn,
+        "settings" : dict((key, settings[key]) for key in connectKeys),
+        "hdbc"     : conn,
+        "hstmt"    : dbi,
+        "used"     : time.time()
+    }
+    
+    db2_switch(name)
     
-    # Save the values for future use
+    # Save the values for future use, including the connection profile for -fanout
     
+    settings.setdefault("profiles", {})[name] = dict(connections[name]["settings"])
     save_settings()
     
     success("Connection successful.")
     
-# Parse the CONNECT statement and execute if possible 
+# Parse the CONNECT statement and execute if possible. CONNECT AS name on its own switches to a 
+# connection that is already open.
 
 def parseConnect(inSQL):
     
-    global settings, connected
+    global settings, connected, hdbc, hstmt, connections, currentConnection
 
     connected = False
     
     cParms = inSQL.split()
     cnt = 0
+    name = None
+    changed = False
     
     while cnt < len(cParms):
         if cParms[cnt].upper() == 'TO':
             if cnt+1 < len(cParms):
                 settings["database"] = cParms[cnt+1].upper()
+                changed = True
                 cnt = cnt + 1
             else:
                 errormsg("No database specified in the CONNECT statement")
@@ -541,6 +1238,7 @@ def parseConnect(inSQL):
         elif cParms[cnt].upper() == 'USER':
             if cnt+1 < len(cParms):
                 settings["uid"] = cParms[cnt+1].upper()
+                changed = True
                 cnt = cnt + 1
             else:
                 errormsg("No userid specified in the CONNECT statement")
@@ -550,6 +1248,7 @@ def parseConnect(inSQL):
                 settings["pwd"] = cParms[cnt+1]   
                 if (settings["pwd"] == '?'):
                     settings["pwd"] = getpass.getpass("Password [password]: ") or "password"
+                changed = True
                 cnt = cnt + 1
             else:
                 errormsg("No password specified in the CONNECT statement")
@@ -557,6 +1256,7 @@ def parseConnect(inSQL):
         elif cParms[cnt].upper() == 'HOST':
             if cnt+1 < len(cParms):
                 settings["hostname"] = cParms[cnt+1].upper()
+                changed = True
                 cnt = cnt + 1
             else:
                 errormsg("No hostname specified in the CONNECT statement")
@@ -564,18 +1264,64 @@ def parseConnect(inSQL):
         elif cParms[cnt].upper() == 'PORT':                           
             if cnt+1 < len(cParms):
                 settings["port"] = cParms[cnt+1].upper()
+                changed = True
                 cnt = cnt + 1
             else:
                 errormsg("No port specified in the CONNECT statement")
                 return
+        elif cParms[cnt].upper() == 'AS':
+            if cnt+1 < len(cParms):
+                name = cParms[cnt+1].upper()
+                cnt = cnt + 1
+            else:
+                errormsg("No connection name specified in the CONNECT statement")
+                return
         elif cParms[cnt].upper() == 'RESET': 
              settings["database"] = ''
+             if hdbc is not None: db2_statement_cache_reset(hdbc)
+             if currentConnection is not None: db2_disconnect(currentConnection)
+             hdbc = None
+             hstmt = None
+             currentConnection = None
              success("Connection reset.")
              return
         else:
             cnt = cnt + 1
+            
+    if name != None and changed == False and name in connections:
+        if db2_switch(name) == True: success("Connection successful.")
+        return
                      
-    db2_doConnect()
+    db2_doConnect(name)
+
+# Find an option that takes a value (i.e. -chunk 1000) and remove it from the parameter string
+
+def getOption(Parms, option):
+    
+    match = re.search(r'(^|\s)' + re.escape(option) + r'\s+("[^"]*"|\'[^\']*\'|\S+)', Parms)
+    if match == None: return Parms, None
+    
+    value = match.group(2)
+    if len(value) >= 2 and value[0] in "'\"" and value[-1] == value[0]: value = value[1:-1]
+    
+    return Parms[:match.start()] + " " + Parms[match.end():], value
+
+# Find an option that is followed by a list of keyword=value settings (i.e. -bench workers=4 runs=100) and 
+# remove it from the parameter string. Only the keywords in the list are recognized. The values are returned 
+# in a dictionary, or None if the option was not used.
+
+def getOptionSettings(Parms, option, keywords):
+    
+    pattern = r'(^|\s)' + re.escape(option) + r'((?:\s+(?:' + "|".join(keywords) + r')=\S+)*)(?=\s|$)'
+    match = re.search(pattern, Parms, flags=re.I)
+    if match == None: return Parms, None
+    
+    values = {}
+    for setting in match.group(2).split():
+        keyword, value = setting.split("=", 1)
+        values[keyword.lower()] = value
+        
+    return Parms[:match.start()] + " " + Parms[match.end():], values
 
 # Find a keyword in a SQL string
 
@@ -592,46 +1338,2744 @@ def findKeyword(keywords,keyword):
     else:
         return False
     
-# Run a command for one second to see how many times we execute it and return the count
+# Statements that can use parameter markers. DDL and compound statements are always run as-is.
 
-def sqlTimer(flag_cmd, inSQL):
-    
-    global hdbc, hstmt, runtime
+bindable = ["SELECT", "WITH", "VALUES", "INSERT", "UPDATE", "DELETE", "MERGE", "CALL"]
 
-    db2Block = 2
-    count = 0
-    t_end = time.time() + runtime
+# Lists, tuples, sets, arrays and Series bound with IN (:var) are expanded into parameter markers when they
+# have up to listsize values. The markers are padded to the next power of two (repeating the last value)
+# so that lists of different lengths share a few prepared statements. Longer lists are inserted into a 
+# declared global temporary table and the IN list becomes a subquery on that table, so Db2 joins to the
+# values instead of parsing them.
+
+listsize = 1000
+
+class DB2List(object):
+    
+    def __init__(self, table, values):
+        
+        self.table = table
+        self.values = values
+        
+    def __repr__(self):
+        
+        digest = hashlib.sha1(repr(self.values).encode("utf-8")).hexdigest()
+        return "DB2List({0}, {1} values, {2})".format(self.table, len(self.values), digest)
+    
+# Check if a host variable holds a collection of values rather than a single value
+
+def db2_is_list(value):
+    
+    if isinstance(value, (list, tuple, set, frozenset)): return True
+    
+    return hasattr(value, "tolist") and getattr(value, "ndim", 0) == 1
+
+# Return the parameter values for a short list, padded to the next power of two up to listsize
+
+def db2_list_markers(values):
+    
+    global listsize
+    
+    if len(values) == 0: return [None]
+    
+    size = 1
+    while size < len(values): size = size * 2
+    size = max(len(values), min(size, listsize))
+    
+    return values + [values[-1]] * (size - len(values))
+
+# Declare and fill the temporary tables of the long lists in a parameter list on a connection and return
+# the remaining parameter values. Cached statements that use the tables are dropped because declaring a
+# table again invalidates them.
+
+def db2_list_tables(parms, conn):
+    
+    global loadbatch
+    
+    if parms == None or not any(isinstance(parm, DB2List) for parm in parms): return parms
+    
+    for parm in parms:
+        if not isinstance(parm, DB2List): continue
+        series = pandas.Series(parm.values).drop_duplicates()
+        ibm_db.exec_immediate(conn, "DECLARE GLOBAL TEMPORARY TABLE " + parm.table + " (ITEM " + db2_column_type(series) + 
+                              ") ON COMMIT PRESERVE ROWS NOT LOGGED WITH REPLACE")
+        db2_statement_cache(conn).forget(parm.table)
+        stmt = ibm_db.prepare(conn, "INSERT INTO " + parm.table + " VALUES (?)")
+        values = db2_column_values(series)
+        for first in range(0, len(values), loadbatch):
+            ibm_db.execute_many(stmt, tuple((value,) for value in values[first:first+loadbatch]))
+        ibm_db.free_stmt(stmt)
+        
+    return [parm for parm in parms if not isinstance(parm, DB2List)]
+
+# Replace :var host variables with parameter markers and return the values of the variables from the
+# notebook namespace. Variables inside quotes or comments, and names that are not defined in the 
+# namespace, are left alone. A variable that holds a list is bound as an IN list (see listsize).
+
+def db2_bind_vars(sql, namespace):
+    
+    global listsize
+    
+    parms = []
+    text = []
+    pos = 0
+    start = 0
+    quote = None
+    length = len(sql)
+    
+    while pos < length:
+        ch = sql[pos]
+        if quote != None:
+            if ch == quote: quote = None
+        elif ch == "'" or ch == '"':
+            quote = ch
+        elif ch == "-" and sql.startswith("--", pos):
+            eol = sql.find("\n", pos)
+            pos = length if eol < 0 else eol
+            continue
+        elif ch == ":" and (pos == 0 or not (sql[pos-1].isalnum() or sql[pos-1] in "_:")):
+            end = pos + 1
+            while end < length and (sql[end].isalnum() or sql[end] == "_"): end = end + 1
+            name = sql[pos+1:end]
+            if len(name) > 0 and not name[0].isdigit() and name in namespace:
+                value = namespace[name]
+                text.append(sql[start:pos])
+                if db2_is_list(value):
+                    values = list(value.tolist()) if hasattr(value, "tolist") else list(value)
+                    if len(values) <= listsize:
+                        values = db2_list_markers(values)
+                        parms.extend(values)
+                        text.append(", ".join(["?"] * len(values)))
+                    else:
+                        table = "SESSION.DB2LIST_" + name.upper()
+                        parms.append(DB2List(table, values))
+                        text.append("SELECT ITEM FROM " + table)
+                else:
+                    if hasattr(value, "item"): value = value.item()
+                    parms.append(value)
+                    text.append("?")
+                start = end
+                pos = end
+                continue
+        pos = pos + 1
+        
+    if len(parms) == 0: return sql, []
+    text.append(sql[start:])
+    
+    return "".join(text), parms
+
+# Split SQL text into statements. The lines can come from a cell or an open file and are scanned once,
+# so a large script is never read into memory. Delimiters inside quotes or comments are ignored, comments
+# are replaced by white space so the words on either side stay apart, and a "--#SET TERMINATOR x" line 
+# changes the delimiter the same way it does in the CLP. Each statement is returned with the line number
+# it starts on as soon as its delimiter is found.
+
+def db2_split(lines, delimiter=";"):
+    
+    pieces = []
+    quote = None
+    comment = False
+    first = 1
+    tokens = re.compile("'|\"|--|/\\*|" + re.escape(delimiter))
+    
+    for lineno, line in enumerate(lines, 1):
+        
+        if quote == None and comment == False and line.lstrip().upper().startswith("--#SET"):
+            setting = line.split()
+            if len(setting) >= 3 and setting[1].upper() == "TERMINATOR":
+                delimiter = setting[2]
+                tokens = re.compile("'|\"|--|/\\*|" + re.escape(delimiter))
+            if not any(piece.strip() for piece in pieces): first = lineno + 1
+            continue
+        
+        pos = 0
+        length = len(line)
+        while pos < length:
+            if quote != None:
+                end = line.find(quote, pos)
+                if end < 0:
+                    pieces.append(line[pos:])
+                    break
+                pieces.append(line[pos:end+1])
+                quote = None
+                pos = end + 1
+                continue
+            if comment == True:
+                end = line.find("*/", pos)
+                if end < 0: break
+                comment = False
+                pos = end + 2
+                continue
+            match = tokens.search(line, pos)
+            if match == None:
+                pieces.append(line[pos:])
+                break
+            pieces.append(line[pos:match.start()])
+            token = match.group(0)
+            pos = match.end()
+            if token == "'" or token == '"':
+                quote = token
+                pieces.append(token)
+            elif token == "--":
+                pieces.append("\n")
+                break
+            elif token == "/*":
+                pieces.append(" ")
+                comment = True
+            else:
+                sql = "".join(pieces).strip()
+                pieces = []
+                if len(sql) > 0: yield first, sql
+                first = lineno
+        
+        if not any(piece.strip() for piece in pieces):
+            pieces = []
+            first = lineno + 1
+    
+    sql = "".join(pieces).strip()
+    if len(sql) > 0: yield first, sql
+
+# A least recently used cache of prepared statement handles for one connection. The key is the SQL text
+# with the whitespace normalized, so reformatting a statement does not cause a new prepare.
+
+class DB2StatementCache(object):
+    
+    def __init__(self, size):
+        
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def prepare(self, conn, sql):
+        
+        key = " ".join(sql.split())
+        stmt = self.entries.get(key)
+        if stmt is not None:
+            self.entries.move_to_end(key)
+            self.hits = self.hits + 1
+            return stmt
+        
+        self.misses = self.misses + 1
+        stmt = ibm_db.prepare(conn, sql)
+        if self.size > 0:
+            self.entries[key] = stmt
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions = self.evictions + 1
+                
+        return stmt
+    
+    # Drop the statements that refer to a table
+    
+    def forget(self, table):
+        
+        for key, stmt in list(self.entries.items()):
+            if table in key:
+                del self.entries[key]
+                try:
+                    ibm_db.free_stmt(stmt)
+                except Exception:
+                    pass
+                
+    # Remove a statement from the cache because the caller keeps its cursor open
+    
+    def detach(self, stmt):
+        
+        for key, cached in list(self.entries.items()):
+            if cached is stmt: del self.entries[key]
+            
+    def clear(self):
+        
+        for stmt in self.entries.values():
+            try:
+                ibm_db.free_stmt(stmt)
+            except Exception:
+                pass
+        self.entries.clear()
+        
+# Return the statement cache for a connection, creating it if necessary
+
+def db2_statement_cache(conn):
+    
+    global stmtCaches, stmtcachesize
+    
+    cache = stmtCaches.get(conn)
+    if cache is None:
+        cache = DB2StatementCache(stmtcachesize)
+        stmtCaches[conn] = cache
+        
+    return cache
+
+# Drop the prepared statements of a connection (CONNECT RESET or a reconnect)
+
+def db2_statement_cache_reset(conn):
+    
+    global stmtCaches
+    
+    cache = stmtCaches.pop(conn, None)
+    if cache is not None: cache.clear()
+
+# Return the hit/miss counters of the prepared statement caches
+
+def db2_statement_cache_stats():
+    
+    global stmtCaches, stmtcachesize
+    
+    stats = {"size": stmtcachesize, "entries": 0, "hits": 0, "misses": 0, "evictions": 0}
+    for cache in stmtCaches.values():
+        stats["entries"] = stats["entries"] + len(cache.entries)
+        stats["hits"] = stats["hits"] + cache.hits
+        stats["misses"] = stats["misses"] + cache.misses
+        stats["evictions"] = stats["evictions"] + cache.evictions
+        
+    return stats
+
+# Statement statistics. Every statement run by %sql records an event with the time spent preparing,
+# executing, waiting for the first rows, fetching, building the DataFrame and displaying the results, along
+# with the rows and approximate bytes fetched and any error. The last statsize events are kept for -stats
+# and each finished event is passed to the functions registered with db2_stats_callback.
+
+statsize = 1000
+statementStats = collections.deque(maxlen=statsize)
+statsCallbacks = []
+statementEvent = threading.local()
+
+statsPhases = ["prepare", "execute", "first_row", "fetch", "convert", "display"]
+
+# A hash of the statement text with the whitespace normalized, so the same statement can be found in
+# the statistics no matter how it was formatted
+
+def db2_sql_hash(sql):
+    
+    return hashlib.sha1(" ".join(sql.split()).encode("utf-8")).hexdigest()[:16]
+
+# Start the event for a statement on this thread. Any event the thread still has open is finished first.
+
+def db2_stats_start(sql, connection=None):
+    
+    global currentConnection
+    
+    db2_stats_finish()
+    
+    now = time.time()
+    event = {
+        "time"       : now,
+        "hash"       : db2_sql_hash(sql),
+        "connection" : currentConnection if connection == None else connection,
+        "sql"        : " ".join(sql.split())[:200],
+        "rows"       : 0,
+        "bytes"      : 0,
+        "error"      : None,
+        "_last"      : now,
+        "_key"       : db2_history_key(sql)
+    }
+    for phase in statsPhases: event[phase] = 0.0
+    statementEvent.event = event
+    
+    return event
+
+# Add time, rows or bytes to the open event of this thread. Nothing is recorded if there is no open event.
+
+def db2_stats_add(key, value):
+    
+    event = getattr(statementEvent, "event", None)
+    if event is None: return
+    
+    event[key] = event[key] + value
+    event["_last"] = time.time()
+    
+def db2_stats_error(message):
+    
+    event = getattr(statementEvent, "event", None)
+    if event is not None: event["error"] = message
+    
+# Finish the open event of this thread. The time between the last database work and the end of the 
+# statement (the next statement or the end of the cell) is counted as display time. The event is added to
+# the history and passed to the callbacks. An error in a callback does not stop the statement.
+
+def db2_stats_finish(*args):
+    
+    event = getattr(statementEvent, "event", None)
+    if event is None: return
+    statementEvent.event = None
+    
+    now = time.time()
+    event["display"] = now - event.pop("_last")
+    event["total"] = now - event["time"]
+    statementStats.append(event)
+    
+    key = event.pop("_key")
+    if event["error"] == None: db2_history_record(key, event)
+    
+    for callback in list(statsCallbacks):
+        try:
+            callback(dict(event))
+        except Exception:
+            pass
+        
+# Register (or with remove=True, unregister) a function that is called with every finished event
+
+def db2_stats_callback(callback, remove=False):
+    
+    if remove == True:
+        if callback in statsCallbacks: statsCallbacks.remove(callback)
+    elif callback not in statsCallbacks:
+        statsCallbacks.append(callback)
+        
+# The recent statement history as a DataFrame
+
+def db2_stats():
+    
+    db2_stats_finish()
+    
+    columns = ["time", "hash", "connection", "sql"] + statsPhases + ["total", "rows", "bytes", "error"]
+    df = pandas.DataFrame(list(statementStats), columns=columns)
+    df["time"] = pandas.to_datetime(df["time"].map(datetime.datetime.fromtimestamp))
+    df.columns = [column.upper() for column in columns]
+    
+    return df
+
+# Query history. The runtimes of the last historysize runs of every statement are kept in db2history.pickle
+# so they survive between sessions. Statements are matched after removing literals and extra whitespace.
+# A warning is shown when a statement takes slowfactor times longer than its median runtime (and at least
+# slowseconds longer), or when -explain estimates a cost over the costlimit setting.
+
+historysize = 50
+historyStore = None
+historyChanged = False
+historyLock = threading.Lock()
+
+sqlLiterals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:E[+-]?\d+)?\b", re.I)
+
+def db2_sql_normalize(sql):
+    
+    return " ".join(sqlLiterals.sub("?", sql).split()).upper()
+
+def db2_history_key(sql):
+    
+    return hashlib.sha1(db2_sql_normalize(sql).encode("utf-8")).hexdigest()[:16]
+
+def db2_history():
+    
+    global historyStore
+    
+    if historyStore is None:
+        try:
+            with open("db2history.pickle", "rb") as f:
+                historyStore = pickle.load(f)
+        except:
+            historyStore = {}
+            
+    return historyStore
+
+# Write the history if it changed. This runs once at the end of every cell instead of after every statement.
+
+def db2_history_save(*args):
+    
+    global historyChanged
+    
+    if historyChanged == False: return
+    
+    with historyLock:
+        historyChanged = False
+        try:
+            with open("db2history.pickle", "wb") as f:
+                pickle.dump(historyStore, f)
+        except:
+            pass
+        
+# The entry for a statement in the history, created if it is not there yet
+
+def db2_history_entry(key, sql):
+    
+    return db2_history().setdefault(key, {"sql": db2_sql_normalize(sql)[:200], "runs": [], "cost": None})
+
+# Add the database time of a finished statement to its history and warn if it was much slower than usual
+
+def db2_history_record(key, event):
+    
+    global settings, historyChanged
+    
+    if settings.get("history", True) == False: return
+    
+    seconds = event["prepare"] + event["execute"] + event["fetch"]
+    
+    with historyLock:
+        entry = db2_history_entry(key, event["sql"])
+        runs = entry["runs"]
+        baseline = float(numpy.median([run[1] for run in runs])) if len(runs) >= 3 else None
+        runs.append((event["time"], seconds))
+        del runs[:-historysize]
+        historyChanged = True
+        
+    if baseline != None and seconds > baseline * settings.get("slowfactor", 3.0) and \
+       seconds - baseline >= settings.get("slowseconds", 1.0):
+        db2_warning("This statement took {0:.2f} seconds, {1:.1f} times longer than its usual {2:.2f} seconds.".format(
+                    seconds, seconds / baseline, baseline))
+        
+# The runtime history as a DataFrame with the number of runs, median, last and estimated cost per statement
+
+def db2_history_stats():
+    
+    rows = []
+    with historyLock:
+        for key, entry in db2_history().items():
+            seconds = [run[1] for run in entry["runs"]]
+            if len(seconds) == 0: continue
+            rows.append([key, entry["sql"], len(seconds), float(numpy.median(seconds)), seconds[-1], 
+                         datetime.datetime.fromtimestamp(entry["runs"][-1][0]), entry["cost"]])
+            
+    return pandas.DataFrame(rows, columns=["HASH", "SQL", "RUNS", "MEDIAN", "LAST", "LAST_RUN", "COST"])
+
+# The approximate size of a fetched column buffer. Strings are estimated from the first 100 values.
+
+def db2_buffer_bytes(buffer):
+    
+    if buffer.dtype != object or len(buffer) == 0: return buffer.nbytes
+    
+    sample = buffer[:100]
+    size = sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in sample)
+    
+    return size * len(buffer) // len(sample)
+
+# Execute a statement. Statements with parameter values are prepared once through the statement cache
+# and then executed with the values bound to the parameter markers. Every statement that is run on a 
+# connection goes through db2_exec_once, which first closes a preview cursor left open there.
+
+def db2_exec(sql, parms=None, conn=None):
+    
+    global hdbc
+    
+    if conn is None: conn = hdbc
+    
+    try:
+        return db2_exec_once(sql, parms, conn)
+    except Exception:
+        
+        # If the connection was lost get a new one. Queries are retried, but anything else may have
+        # been applied before the connection dropped so the error is returned.
+        
+        if not db2_connection_lost(conn): raise
+        conn = db2_reconnect(conn)
+        keywords = sql.split()
+        if conn is None or len(keywords) == 0 or keywords[0].upper() not in ["SELECT", "WITH", "VALUES"]: raise
+        return db2_exec_once(sql, parms, conn)
+    
+def db2_exec_once(sql, parms, conn):
+    
+    db2_preview_close(conn)
+    parms = db2_list_tables(parms, conn)
+    
+    start = time.time()
+    if parms == None or len(parms) == 0:
+        stmt = ibm_db.exec_immediate(conn,sql)
+        db2_stats_add("execute", time.time() - start)
+        return stmt
+    
+    stmt = db2_statement_cache(conn).prepare(conn, sql)
+    prepared = time.time()
+    db2_stats_add("prepare", prepared - start)
+    ibm_db.execute(stmt, tuple(parms))
+    db2_stats_add("execute", time.time() - prepared)
+    
+    return stmt
+
+# Run a command for one second to see how many times we execute it and return the count
+
+def sqlTimer(flag_cmd, inSQL, parms=None):
+    
+    global hdbc, hstmt, runtime
+
+    db2Block = 2
+    count = 0
+    
+    # The statement is prepared once so the timing only includes execution
+    
+    try:
+        db2_preview_close(hdbc)
+        parms = db2_list_tables(parms, hdbc)
+        stmt = db2_statement_cache(hdbc).prepare(hdbc, inSQL)
+    except Exception as err:
+        db2_error(False)
+        return(-1)
+    
+    parms = tuple(parms or [])
+    
+    t_end = time.time() + runtime
     while time.time() < t_end:
         if (flag_cmd == db2Block):
             try:
-                stmt = ibm_db.exec_immediate(hdbc,inSQL)
+                ibm_db.execute(stmt, parms)
             except Exception as err:
                 db2_error(False)
                 return(-1)
         else:
             try:
-                stmt = ibm_db.exec_immediate(hdbc,inSQL)
-                while( ibm_db.fetch_row(stmt) ): pass
-            except Exception as err:
-                db2_error(False)
-                return(-1)
+                ibm_db.execute(stmt, parms)
+                while( ibm_db.fetch_row(stmt) ): pass
+            except Exception as err:
+                db2_error(False)
+                return(-1)
+        
+        count = count + 1
+        
+    return(count)
+
+# Db2 column types that can be stored in a typed NumPy buffer. Everything else (strings, dates, LOBs)
+# is kept as a Python object. DECIMAL is converted to a float in the same way pandas.read_sql does.
+
+db2_numeric = {
+     "int"      : "int64",
+     "smallint" : "int64",
+     "bigint"   : "int64",
+     "real"     : "float64",
+     "float"    : "float64",
+     "double"   : "float64",
+     "decimal"  : "float64",
+     "numeric"  : "float64",
+     "decfloat" : "float64"
+}
+
+# Retrieve the column descriptors of an answer set once before fetching any rows
+
+def db2_columns(stmt):
+    
+    columns = []
+    for col in range(ibm_db.num_fields(stmt)):
+        columns.append({
+            "name"      : ibm_db.field_name(stmt,col),
+            "type"      : str(ibm_db.field_type(stmt,col)).lower(),
+            "precision" : ibm_db.field_precision(stmt,col),
+            "scale"     : ibm_db.field_scale(stmt,col)
+        })
+        
+    return columns
+
+# ibm_db reports SMALLINT and INTEGER columns as "int", and REAL, FLOAT and DOUBLE columns as "real". The
+# precision tells them apart: SMALLINT has 5 digits and REAL has 7 digits (24 bits). Any other precision 
+# of a "real" column is taken to be a DOUBLE so that no digits are lost.
+
+def db2_result_type(column):
+    
+    db2type = column["type"]
+    if db2type == "int" and column["precision"] == 5:
+        return "smallint"
+    if db2type == "real" and column["precision"] not in [7, 24]:
+        return "double"
+    
+    return db2type
+
+# Fetch up to "rows" rows from an open statement. Older ibm_db drivers do not have fetchmany, so we 
+# fall back to fetching one tuple at a time.
+
+def db2_fetchmany(stmt, rows):
+    
+    if hasattr(ibm_db, "fetchmany"):
+        return ibm_db.fetchmany(stmt, rows) or []
+    
+    batch = []
+    while len(batch) < rows:
+        result = ibm_db.fetch_tuple(stmt)
+        if not result: break
+        batch.append(result)
+        
+    return batch
+
+# Return the rows of an open statement in batches of fetchsize, stopping after maxrows rows (-1 for all).
+# With a prefetchdepth above 0 a background thread keeps fetching the next batches into a bounded queue 
+# while the caller converts the current one, so the network wait and the conversion overlap. The driver
+# releases the GIL while it waits for Db2. Errors in the thread are raised to the caller. Close the
+# generator before using the statement again if you stop early.
+
+def db2_batches(stmt, maxrows=-1):
+    
+    global fetchsize, prefetchdepth
+    
+    if prefetchdepth <= 0:
+        count = 0
+        while maxrows < 0 or count < maxrows:
+            size = fetchsize if maxrows < 0 else min(fetchsize, maxrows - count)
+            batch = db2_fetchmany(stmt, size)
+            count = count + len(batch)
+            if len(batch) > 0: yield batch
+            if len(batch) < size: break
+        return
+    
+    batches = queue.Queue(prefetchdepth)
+    stop = threading.Event()
+    thread = threading.Thread(target=db2_prefetch, args=(stmt, maxrows, fetchsize, batches, stop), name="db2-prefetch")
+    thread.daemon = True
+    thread.start()
+    
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None: break
+            if isinstance(batch, Exception): raise batch
+            yield batch
+    finally:
+        stop.set()
+        thread.join()
+        
+# The prefetch thread. The end of the rows is marked with None.
+
+def db2_prefetch(stmt, maxrows, blocksize, batches, stop):
+    
+    count = 0
+    try:
+        while not stop.is_set() and (maxrows < 0 or count < maxrows):
+            size = blocksize if maxrows < 0 else min(blocksize, maxrows - count)
+            batch = db2_fetchmany(stmt, size)
+            count = count + len(batch)
+            if len(batch) > 0: db2_prefetch_put(batches, batch, stop)
+            if len(batch) < size: break
+    except Exception as err:
+        db2_prefetch_put(batches, err, stop)
+        
+    db2_prefetch_put(batches, None, stop)
+    
+# Wait for room in the queue, giving up if the caller has stopped reading
+
+def db2_prefetch_put(batches, item, stop):
+    
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+# Convert the values of one column in a batch into a NumPy array. Integer columns that contain NULLs
+# are stored as floats (NaN) which matches what pandas.read_sql returned.
+
+def db2_column_buffer(values, db2type):
+    
+    dtype = db2_numeric.get(db2type)
+    
+    if dtype == "int64":
+        try:
+            return numpy.array(values, dtype=numpy.int64)
+        except (TypeError, ValueError, OverflowError):
+            return numpy.array(values, dtype=numpy.float64)
+        
+    if dtype is not None:
+        return numpy.array(values, dtype=dtype)
+    
+    buffer = numpy.empty(len(values), dtype=object)
+    buffer[:] = values
+    return buffer
+
+# Join the batches of one column into a single array. Each column is concatenated exactly once and 
+# timestamps are converted to datetime64 values.
+
+def db2_column_array(column, chunks):
+    
+    if len(chunks) == 0:
+        values = numpy.empty(0, dtype=db2_numeric.get(column["type"], object))
+    elif len(chunks) == 1:
+        values = chunks[0]
+    else:
+        values = numpy.concatenate(chunks)
+        
+    if column["type"] == "timestamp":
+        values = pandas.to_datetime(values).values
+        
+    return values
+
+# Build a DataFrame from the per-column buffers
+
+def db2_build_frame(columns, buffers):
+    
+    start = time.time()
+    
+    data = {}
+    for col, column in enumerate(columns):
+        data[col] = db2_column_array(column, buffers[col])
+        
+    df = pandas.DataFrame(data, copy=False)
+    df.columns = [column["name"] for column in columns]
+    
+    db2_stats_add("convert", time.time() - start)
+    
+    return df
+
+# Fetch the answer set of an executed statement into a DataFrame. Rows are retrieved in batches of
+# fetchsize and placed into typed column buffers, so no list of row tuples is kept for the whole result.
+# A maxrows value of -1 fetches every row. The column descriptors can be passed in when the same
+# statement is fetched more than once. The progress function is called with the number of rows fetched
+# after each batch and stops the fetch if it returns False.
+
+def db2_fetch_frame(stmt, maxrows=-1, columns=None, progress=None):
+    
+    if columns == None:
+        columns = db2_columns(stmt)
+        
+    return db2_build_frame(columns, db2_fetch_buffers(stmt, maxrows, columns, progress))
+
+# Fetch rows into a list of typed array batches for each column. This is the fetch loop that is shared
+# by DataFrames and the compact -r array results.
+
+def db2_fetch_buffers(stmt, maxrows, columns, progress=None):
+    
+    buffers = [[] for column in columns]
+    count = 0
+    
+    batches = db2_batches(stmt, maxrows)
+    try:
+        start = time.time()
+        for rows in batches:
+            if count == 0: db2_stats_add("first_row", time.time() - start)
+            count = count + len(rows)
+            for col, values in enumerate(zip(*rows)):
+                buffer = db2_column_buffer(values, columns[col]["type"])
+                buffers[col].append(buffer)
+                db2_stats_add("bytes", db2_buffer_bytes(buffer))
+            db2_stats_add("rows", len(rows))
+            db2_stats_add("fetch", time.time() - start)
+            if progress != None and progress(count) == False: break
+            start = time.time()
+    finally:
+        batches.close()
+            
+    return buffers
+
+# Record the throughput of a fetch so it can be compared between fetch methods
+
+def db2_fetch_rate(method, rows, elapsed):
+    
+    global lastFetch
+    
+    lastFetch = {
+        "method"   : method,
+        "rows"     : rows,
+        "seconds"  : elapsed,
+        "rows/sec" : rows / elapsed if elapsed > 0 else 0.0
+    }
+    
+    return lastFetch
+
+# Execute a SELECT statement and return the answer set as a DataFrame using the native fetch engine
+
+def db2_fetch(sql, maxrows=-1, parms=None):
+    
+    global hdbc
+    
+    start = time.time()
+    stmt = db2_exec(sql, parms)
+    df = db2_fetch_frame(stmt, maxrows)
+    ibm_db.free_result(stmt)
+    db2_fetch_rate("native", len(df), time.time() - start)
+    
+    return df
+
+# A compact answer set for -r array. The values are kept in one typed NumPy array per column instead of a
+# list of Python values per row. Indexing with a number returns the row as a tuple, a slice returns the 
+# rows as another DB2Rows that shares the arrays and a column name returns the array for that column.
+# to_pandas() builds a DataFrame on top of the same arrays.
+
+class DB2Rows(object):
+    
+    def __init__(self, columns, arrays):
+        
+        self.columns = [column["name"] for column in columns]
+        self._columns = columns
+        self._arrays = arrays
+        
+    @classmethod
+    def fetch(cls, stmt, maxrows=-1, columns=None):
+        
+        if columns == None: columns = db2_columns(stmt)
+        buffers = db2_fetch_buffers(stmt, maxrows, columns)
+        return cls(columns, [db2_column_array(column, buffers[col]) for col, column in enumerate(columns)])
+    
+    @property
+    def nbytes(self):
+        
+        return sum(array.nbytes for array in self._arrays)
+    
+    def to_pandas(self):
+        
+        df = pandas.DataFrame(dict(enumerate(self._arrays)), copy=False)
+        df.columns = self.columns
+        return df
+    
+    def __len__(self):
+        
+        return len(self._arrays[0]) if len(self._arrays) > 0 else 0
+    
+    def __iter__(self):
+        
+        return zip(*self._arrays)
+    
+    def __getitem__(self, key):
+        
+        if isinstance(key, str):
+            return self._arrays[self.columns.index(key)]
+        if isinstance(key, slice):
+            return DB2Rows(self._columns, [array[key] for array in self._arrays])
+        return tuple(array[key] for array in self._arrays)
+    
+    def __repr__(self):
+        
+        return "DB2Rows({0} rows, {1} columns: {2})".format(len(self), len(self.columns), ", ".join(self.columns))
+    
+# The preview that has a cursor open on each connection. The cursor is closed as soon as another statement
+# runs on the connection, because an open (WITH HOLD) cursor keeps locks that can block later statements
+# such as a DROP TABLE.
+
+openPreviews = {}
+
+# A preview of an answer set. Only the first maxrows rows are fetched when the statement runs and the
+# statement is left open. The remaining rows are fetched the first time the full answer set is needed 
+# (to_pandas, len, iteration, indexing or any DataFrame attribute). If the cursor has been closed because
+# another statement ran on the connection, the statement is run again to fetch all of the rows.
+
+class DB2Result(object):
+    
+    def __init__(self, stmt, columns, preview, maxrows, sql, parms, conn):
+        
+        self._stmt = stmt
+        self._columns = columns
+        self._preview = preview
+        self._maxrows = maxrows
+        self._sql = sql
+        self._parms = parms
+        self._conn = conn
+        self._df = None
+        
+    def to_pandas(self):
+        
+        if self._df is None:
+            start = time.time()
+            if self._stmt is not None:
+                rest = db2_fetch_frame(self._stmt, -1, self._columns)
+                self._release()
+                self._df = pandas.concat([self._preview, rest], ignore_index=True)
+                db2_fetch_rate("remainder", len(rest), time.time() - start)
+            else:
+                stmt = db2_exec(self._sql, self._parms, self._conn)
+                self._df = db2_fetch_frame(stmt, -1, self._columns)
+                ibm_db.free_result(stmt)
+                db2_fetch_rate("rerun", len(self._df), time.time() - start)
+            
+        return self._df
+    
+    def _release(self):
+        
+        global openPreviews
+        
+        if self._stmt is not None:
+            try:
+                ibm_db.free_result(self._stmt)
+            except Exception:
+                pass
+            self._stmt = None
+            if openPreviews.get(self._conn) is self: del openPreviews[self._conn]
+            
+    def __del__(self):
+        
+        self._release()
+        
+    def __len__(self):
+        
+        return len(self.to_pandas())
+    
+    def __iter__(self):
+        
+        return iter(self.to_pandas())
+    
+    def __getitem__(self, key):
+        
+        return self.to_pandas()[key]
+    
+    def __getattr__(self, name):
+        
+        if name.startswith("_"): raise AttributeError(name)
+        return getattr(self.to_pandas(), name)
+    
+    def _message(self):
+        
+        if self._df is None:
+            return "Showing the first %d rows. Use .to_pandas() to retrieve all rows." % self._maxrows
+        else:
+            return "%d rows" % len(self._df)
+    
+    def __repr__(self):
+        
+        if self._df is not None: return repr(self._df)
+        return repr(self._preview.head(self._maxrows)) + "\n\n" + self._message()
+    
+    def _repr_html_(self):
+        
+        if self._df is not None: return self._df._repr_html_()
+        return self._preview.head(self._maxrows)._repr_html_() + "<p>" + self._message() + "</p>"
+
+# Execute a SELECT statement but only fetch enough rows to display it. One extra row tells us if there
+# is more data. If the whole answer set fits in the preview a DataFrame is returned, otherwise a DB2Result
+# that keeps the statement open for the rest of the rows.
+
+def db2_preview(sql, maxrows, parms=None):
+    
+    global hdbc, openPreviews
+    
+    start = time.time()
+    stmt = db2_exec(sql, parms)
+    columns = db2_columns(stmt)
+    preview = db2_fetch_frame(stmt, maxrows+1, columns)
+    db2_fetch_rate("preview", len(preview), time.time() - start)
+    
+    if len(preview) <= maxrows:
+        ibm_db.free_result(stmt)
+        return preview
+    
+    db2_statement_cache(hdbc).detach(stmt)
+    result = DB2Result(stmt, columns, preview, maxrows, sql, parms, hdbc)
+    openPreviews[hdbc] = result
+    
+    return result
+
+# Close the cursor of the preview that is open on a connection, if there is one
+
+def db2_preview_close(conn):
+    
+    global openPreviews
+    
+    result = openPreviews.pop(conn, None)
+    if result is not None: result._release()
+
+# Return the answer set in chunks of "rows" rows. The statement is executed right away so that errors
+# are reported immediately, but rows are only fetched when the generator asks for the next chunk.
+
+def db2_chunks(sql, rows, raw=False, parms=None):
+    
+    global hdbc
+    
+    stmt = db2_exec(sql, parms)
+    db2_statement_cache(hdbc).detach(stmt)
+    return db2_chunk_generator(stmt, rows, raw)
+
+# Generator used by db2_chunks. Each chunk is a DataFrame, a list of rows when raw is True or a DB2Rows 
+# when raw is "array". The statement is released when the generator is exhausted, closed, interrupted or
+# garbage collected.
+
+def db2_chunk_generator(stmt, rows, raw=False):
+    
+    try:
+        columns = db2_columns(stmt)
+        while True:
+            if raw == "array":
+                chunk = DB2Rows.fetch(stmt, rows, columns)
+            elif raw == True:
+                chunk = [list(row) for row in db2_fetchmany(stmt, rows)]
+            else:
+                chunk = db2_fetch_frame(stmt, rows, columns)
+            if len(chunk) == 0: break
+            yield chunk
+            if len(chunk) < rows: break
+    finally:
+        try:
+            ibm_db.free_result(stmt)
+        except Exception:
+            pass
+
+# Decode a JSON document returned by Db2. BSON2JSON returns text and JSON_VAL returns plain values, so 
+# anything that is not a JSON object or array is returned unchanged.
+
+def db2_json_loads(value):
+    
+    if isinstance(value, (bytes, bytearray)):
+        text = value.lstrip()
+        if text[:1] not in (b"{", b"["): return value
+    elif isinstance(value, str):
+        text = value.lstrip()
+        if text[:1] not in ("{", "["): return value
+    else:
+        return value
+    
+    try:
+        return db2_fastjson().loads(text)
+    except (ValueError, TypeError):
+        return value
+    
+# Flatten a JSON document into a dictionary of dotted column names (address.city). Arrays are kept as 
+# values. If paths is given only those fields, and the fields underneath them, are kept.
+
+def db2_json_flatten(doc, row, prefix="", paths=None):
+    
+    for key, value in doc.items():
+        name = prefix + key
+        keep = paths == None or any(name == path or name.startswith(path + ".") for path in paths)
+        if keep == False and not any(path.startswith(name + ".") for path in paths): continue
+        if isinstance(value, dict):
+            db2_json_flatten(value, row, name + ".", None if keep else paths)
+        elif keep == True:
+            row[name] = value
+            
+    return row
+
+# Fetch the JSON documents in the first column of a query in batches and pretty print up to maxrows 
+# of them (-1 for all). The output is printed once at the end instead of once per row.
+
+def db2_json_print(sql, parms=None, maxrows=-1):
+    
+    stmt = db2_exec(sql, parms)
+    
+    output = []
+    count = 0
+    batches = db2_batches(stmt, maxrows)
+    try:
+        for batch in batches:
+            for row in batch:
+                count = count + 1
+                doc = db2_json_loads(row[0])
+                if isinstance(doc, (dict, list)):
+                    doc = json.dumps(doc, indent=4, separators=(',', ': '))
+                elif isinstance(doc, (bytes, bytearray)):
+                    doc = repr(doc)
+                if count > 1: output.append("")
+                output.append("Row: %d" % count)
+                output.append(str(doc))
+    finally:
+        batches.close()
+            
+    more = maxrows >= 0 and count == maxrows and len(db2_fetchmany(stmt, 1)) > 0
+        
+    ibm_db.free_result(stmt)
+    
+    if count > 0: print("\n".join(output))
+    if more == True:
+        print("\nOnly the first %d rows are displayed. Use -a to display all rows." % count)
+        
+    return count
+
+# Fetch the result of a query in batches and flatten the JSON documents in each column into a DataFrame. 
+# Columns that do not contain JSON objects, like the output of JSON_VAL, are kept as they are. The paths 
+# are a list of dotted field names to keep.
+
+def db2_json_table(sql, parms=None, paths=None):
+    
+    stmt = db2_exec(sql, parms)
+    names = [column["name"] for column in db2_columns(stmt)]
+    
+    records = []
+    batches = db2_batches(stmt)
+    try:
+        for batch in batches:
+            for values in batch:
+                row = {}
+                for name, value in zip(names, values):
+                    doc = db2_json_loads(value)
+                    if isinstance(doc, dict):
+                        db2_json_flatten(doc, row, "", paths)
+                    else:
+                        row[name] = doc
+                records.append(row)
+    finally:
+        batches.close()
+        
+    ibm_db.free_result(stmt)
+    
+    df = pandas.DataFrame.from_records(records)
+    if paths != None:
+        order = [name for path in paths for name in df.columns if name == path or name.startswith(path + ".")]
+        order = order + [name for name in df.columns if name not in order]
+        df = df[order]
+        
+    return df.infer_objects()
+
+# Find the tables that a statement references. Names are returned in uppercase without the schema so the
+# match errs on the side of invalidating too much rather than too little. The statement is split into
+# tokens (after removing comments and string constants) and a table name is expected after FROM, JOIN,
+# INTO, UPDATE, TABLE, MERGE ... USING and CREATE INDEX ... ON, and after every comma of a FROM clause. A
+# derived table in parentheses is skipped over (the tables inside it are found on their own) and the FROM
+# in EXTRACT, TRIM, SUBSTRING and OVERLAY is not a table reference. If the statement reads a table 
+# function, a LATERAL or data-change table reference, or updates something that is not named (MERGE ... 
+# UPDATE SET), its tables can't be known and None is returned.
+
+sqlTokens = re.compile(r'--[^\n]*|/\*.*?\*/|\'(?:[^\']|\'\')*\'|"[^"]*"|[\w$#@]+|\S', re.S)
+tableClauses = ["WHERE", "GROUP", "HAVING", "ORDER", "FETCH", "UNION", "EXCEPT", "INTERSECT", "FOR", "OFFSET", 
+                "LIMIT", "SELECT", "VALUES", "SET"]
+tableFunctions = ["EXTRACT", "TRIM", "SUBSTRING", "OVERLAY"]
+tableReserved = ["SET", "SELECT", "VALUES", "WITH", "WHERE", "ON", "AS", "DEFAULT"]
+
+def db2_tables(sql):
+    
+    tokens = [token for token in sqlTokens.findall(sql) if token[:2] not in ["--", "/*"] and token[0] != "'"]
+    words = [token.upper() for token in tokens]
+    
+    tables = set()
+    known = True
+    expect = False
+    clauses = [False]
+    functions = [None]
+    
+    index = 0
+    while index < len(tokens):
+        word = words[index]
+        after = words[index+1] if index + 1 < len(words) else ""
+        before = words[index-1] if index > 0 else ""
+        index = index + 1
+        
+        if word == "(":
+            nested = expect and after not in ["SELECT", "WITH", "VALUES"]
+            clauses.append(nested)
+            functions.append(before)
+            expect = nested
+        elif word == ")":
+            expect = False
+            if len(clauses) > 1:
+                clauses.pop()
+                functions.pop()
+        elif word == ",":
+            expect = clauses[-1]
+        elif expect == True:
+            expect = False
+            if word in ["TABLE", "LATERAL"] and after == "(":
+                known = False
+            elif word in ["FINAL", "OLD", "NEW"] and after == "TABLE":
+                known = False
+            elif word == "SET" and before == "UPDATE":
+                known = False
+            elif word in tableReserved or not (word[0] == '"' or word[0].isalnum() or word[0] in "_$#@"):
+                index = index - 1
+            else:
+                while index + 1 < len(tokens) and words[index] == ".":
+                    word = words[index+1]
+                    index = index + 2
+                tables.add(word.strip('"'))
+        elif word == "FROM":
+            if functions[-1] not in tableFunctions:
+                clauses[-1] = True
+                expect = True
+        elif word in ["JOIN", "INTO", "TABLE"]:
+            expect = True
+        elif word == "USING":
+            expect = words[0] == "MERGE"
+        elif word == "UPDATE":
+            expect = before != "FOR"
+        elif word == "ON":
+            expect = "INDEX" in words[max(0, index-5):index-2]
+        elif word in tableClauses:
+            clauses[-1] = False
+            
+    return tables if known else None
+
+# A least recently used cache of SELECT results. Entries expire after a number of seconds and the total
+# size of the cached DataFrames is kept below a memory budget.
+
+class DB2ResultCache(object):
+    
+    def __init__(self, maxbytes, ttl):
+        
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        
+    def get(self, key):
+        
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses = self.misses + 1
+            return None
+        
+        if entry["expires"] < time.time():
+            self._remove(key)
+            self.expirations = self.expirations + 1
+            self.misses = self.misses + 1
+            return None
+        
+        self.entries.move_to_end(key)
+        self.hits = self.hits + 1
+        return entry["df"]
+    
+    def put(self, key, df, tables):
+        
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.maxbytes: return
+        
+        if key in self.entries: self._remove(key)
+        self.entries[key] = {"df": df, "bytes": size, "tables": tables, "expires": time.time() + self.ttl}
+        self.bytes = self.bytes + size
+        self.trim()
+        
+    def trim(self):
+        
+        while self.bytes > self.maxbytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions = self.evictions + 1
+            
+    def invalidate(self, tables=None):
+        
+        for key, entry in list(self.entries.items()):
+            if tables is None or len(entry["tables"] & tables) > 0:
+                self._remove(key)
+                self.invalidations = self.invalidations + 1
+                
+    def _remove(self, key):
+        
+        entry = self.entries.pop(key)
+        self.bytes = self.bytes - entry["bytes"]
+        
+    def stats(self):
+        
+        return {
+            "entries"       : len(self.entries),
+            "bytes"         : self.bytes,
+            "maxbytes"      : self.maxbytes,
+            "hits"          : self.hits,
+            "misses"        : self.misses,
+            "evictions"     : self.evictions,
+            "expirations"   : self.expirations,
+            "invalidations" : self.invalidations
+        }
+    
+# Return the result cache, resizing it if the cache settings have changed
+
+def db2_result_cache():
+    
+    global resultCache, settings
+    
+    maxbytes = int(settings.get("cachemb", 256) * 1024 * 1024)
+    ttl = settings.get("cachettl", 300)
+    
+    if resultCache is None:
+        resultCache = DB2ResultCache(maxbytes, ttl)
+    elif resultCache.maxbytes != maxbytes or resultCache.ttl != ttl:
+        resultCache.maxbytes = maxbytes
+        resultCache.ttl = ttl
+        resultCache.trim()
+        
+    return resultCache
+
+# Return a SELECT result from the result cache or run it and cache the answer set. The key includes the
+# connection, the normalized SQL and the parameter values. A copy is returned so that changes made to
+# the DataFrame in the notebook do not change the cached result. A statement whose tables can't all be
+# found is never cached, because it could not be invalidated when those tables change.
+
+def db2_cached_fetch(sql, parms=None):
+    
+    global settings
+    
+    tables = db2_tables(sql)
+    if tables is None: return db2_fetch(sql, parms=parms)
+    
+    key = (settings["database"], settings["hostname"], settings["port"], settings["uid"],
+           " ".join(sql.split()), tuple(repr(parm) for parm in parms or []))
+    
+    cache = db2_result_cache()
+    df = cache.get(key)
+    if df is None:
+        df = db2_fetch(sql, parms=parms)
+        cache.put(key, df, tables)
+        
+    return df.copy()
+
+# Invalidate the cached results that depend on the tables changed by a statement. If we can't tell what
+# a statement changes (CALL, compound statements, SET, ROLLBACK) every cached result is dropped.
+
+def db2_result_cache_invalidate(sql):
+    
+    global resultCache
+    
+    if resultCache is None or len(resultCache.entries) == 0: return
+    
+    keywords = sql.split()
+    if len(keywords) == 0: return
+    sqlcmd = keywords[0].upper()
+    
+    if sqlcmd == "COMMIT": return
+    
+    tables = None
+    if sqlcmd in ["INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "CREATE", "DROP", "ALTER", "RENAME", "COMMENT", "LOCK"]:
+        tables = db2_tables(sql) or None
+        
+    resultCache.invalidate(tables)
+    
+# Return the hit/miss/eviction counters of the result cache
+
+def db2_result_cache_stats():
+    
+    return db2_result_cache().stats()
+
+# Refresh the answer set of a polling query for -incremental. The first run fetches every row and keeps 
+# the DataFrame with the largest value of the key column. Later runs of the same statement on the same
+# connection only fetch the rows with a larger key, by running the statement as a derived table with a 
+# "key > ?" predicate that Db2 pushes down, and append them to the kept DataFrame. The key must always 
+# increase for new rows (an identity column, a sequence or an insert timestamp). WITH statements cannot be
+# used as a derived table. With window=N only the last N rows are kept. Returns the whole DataFrame.
+
+def db2_incremental(sql, parms, key, window=0, quiet=False):
+    
+    global incrementalResults, currentConnection
+    
+    if sql.split()[0].upper() == "WITH":
+        errormsg("The -incremental option cannot be used with a WITH statement. Put the query in a view first.")
+        return
+    
+    cacheKey = (currentConnection, " ".join(sql.split()), key.upper())
+    entry = incrementalResults.get(cacheKey)
+    
+    if entry is None:
+        df = db2_fetch(sql, parms=parms)
+        added = len(df)
+    else:
+        wrapped = "SELECT * FROM (" + sql + ") AS DB2INCREMENTAL WHERE " + entry["column"] + " > ?"
+        rows = db2_fetch(wrapped, parms=list(parms or []) + [entry["last"]])
+        added = len(rows)
+        df = entry["df"] if added == 0 else pandas.concat([entry["df"], rows], ignore_index=True)
+        
+    column = [name for name in df.columns if name.upper() == key.upper()]
+    if len(column) == 0:
+        errormsg("The answer set does not have a column called " + key + ".")
+        return
+    column = column[0]
+    
+    if window > 0 and len(df) > window:
+        df = df.iloc[len(df)-window:].reset_index(drop=True)
+        
+    last = df[column].max() if len(df) > 0 else None
+    if entry is not None and (last is None or pandas.isna(last)): last = entry["last"]
+    if hasattr(last, "to_pydatetime"):
+        last = last.to_pydatetime()
+    elif hasattr(last, "item"):
+        last = last.item()
+        
+    if last is not None and not pandas.isna(last):
+        incrementalResults[cacheKey] = {"df": df, "last": last, "column": '"' + column.replace('"', '""') + '"'}
+        
+    if quiet == False:
+        success("{0} new rows, {1} rows in total.".format(added, len(df)))
+        
+    return df
+
+# Statements that change the contents of a table, and the pattern that finds the table being changed
+
+writeCommands = ["INSERT", "UPDATE", "DELETE", "MERGE"]
+targetTable = re.compile(r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|MERGE\s+INTO)\s+((?:"[^"]+"|[\w$#@]+)(?:\s*\.\s*(?:"[^"]+"|[\w$#@]+))?)', re.I)
+
+# Split the statements of a cell into groups that can run at the same time. DDL, COMMIT, CALL and any other
+# statement that is not a query or DML runs on its own, and so does a statement whose tables cannot all be
+# found (table functions, LATERAL) or a query without tables (VALUES) because it may read anything. A statement that reads or writes a table that an
+# earlier statement in the group writes (or that writes a table the group reads) starts a new group.
+
+def db2_parallel_groups(statements):
+    
+    groups = []
+    group = []
+    reads = set()
+    writes = set()
+    
+    for index, (sql, parms, query) in enumerate(statements):
+        sqlcmd = sql.split()[0].upper()
+        if query == False and sqlcmd not in writeCommands:
+            if len(group) > 0: groups.append(group)
+            groups.append([index])
+            group, reads, writes = [], set(), set()
+            continue
+        
+        tables = db2_tables(sql)
+        if tables is None or (query == True and len(tables) == 0):
+            if len(group) > 0: groups.append(group)
+            groups.append([index])
+            group, reads, writes = [], set(), set()
+            continue
+        
+        changes = set()
+        if query == False:
+            target = targetTable.match(sql)
+            if target != None:
+                changes.add(target.group(1).split(".")[-1].strip().strip('"').upper())
+            else:
+                changes = tables
+                
+        if len((tables | changes) & writes) > 0 or len(changes & reads) > 0:
+            groups.append(group)
+            group, reads, writes = [], set(), set()
+            
+        group.append(index)
+        reads = reads | tables
+        writes = writes | changes
+        
+    if len(group) > 0: groups.append(group)
+    
+    return groups
+
+# Run one statement on its own pooled connection. Queries return a DataFrame and other statements 
+# return the number of rows they changed.
+
+def db2_parallel_statement(dsn, sql, parms, query):
+    
+    global currentConnection
+    
+    pool = db2_pool()
+    conn = pool.acquire(dsn)
+    db2_stats_start(sql, currentConnection)
+    try:
+        stmt = db2_exec(sql, parms, conn)
+        if query == True:
+            result = db2_fetch_frame(stmt)
+            ibm_db.free_result(stmt)
+        else:
+            result = ibm_db.num_rows(stmt)
+        return result
+    except Exception as err:
+        errmsg = str(err).replace('\r',' ')
+        db2_stats_error(errmsg[errmsg.rfind("]")+1:].strip())
+        raise
+    finally:
+        db2_stats_finish()
+        pool.release(dsn, conn)
+
+# Run the statements of a cell on up to "workers" connections at once. Each statement is a tuple of 
+# (sql, parameter values, True if it returns an answer set). The results come back in statement order 
+# with the message of the error in place of any statement that failed.
+
+def db2_parallel(statements, workers, quiet=False):
+    
+    global settings, connections, currentConnection
+    
+    if currentConnection in connections:
+        dsn = connections[currentConnection]["dsn"]
+    else:
+        dsn = db2_dsn(settings)
+        
+    results = [None] * len(statements)
+    errors = [None] * len(statements)
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for group in db2_parallel_groups(statements):
+            futures = {}
+            for index in group:
+                sql, parms, query = statements[index]
+                futures[index] = executor.submit(db2_parallel_statement, dsn, sql, parms, query)
+            for index in group:
+                try:
+                    results[index] = futures[index].result()
+                except Exception as err:
+                    errmsg = str(err).replace('\r',' ')
+                    errors[index] = errmsg[errmsg.rfind("]")+1:].strip()
+                    results[index] = errors[index]
+                if statements[index][2] == False: db2_result_cache_invalidate(statements[index][0])
+                    
+    if quiet == False:
+        for index, error in enumerate(errors):
+            if error != None: errormsg("Statement " + str(index+1) + ": " + error)
+            
+    return results
+
+# List the connection profiles that have been saved by CONNECT. Every successful connection is saved under
+# its name in db2connect.pickle so it can be used by -fanout in later sessions.
+
+def db2_profiles():
+    
+    global settings
+    
+    rows = []
+    for name, profile in settings.get("profiles", {}).items():
+        rows.append([name, profile["database"], profile["hostname"], profile["port"], profile["uid"]])
+        
+    return pandas.DataFrame(rows, columns=["NAME", "DATABASE", "HOSTNAME", "PORT", "UID"])
+
+# Run a statement on one fan-out target. The connection comes from the pool and the query timeout is set
+# on the statement so Db2 cancels a statement that runs too long. The start time is recorded so the 
+# caller can apply the timeout from when the target started.
+
+def db2_fanout_target(name, dsn, sql, parms, query, timeout, started):
+    
+    started[name] = time.time()
+    pool = db2_pool()
+    conn = pool.acquire(dsn)
+    try:
+        parms = db2_list_tables(parms, conn)
+        options = {ibm_db.SQL_ATTR_QUERY_TIMEOUT: int(timeout)} if timeout > 0 else {}
+        if parms == None or len(parms) == 0:
+            stmt = ibm_db.exec_immediate(conn, sql, options)
+        else:
+            stmt = ibm_db.prepare(conn, sql, options)
+            ibm_db.execute(stmt, tuple(parms))
+        if query == True:
+            result = db2_fetch_frame(stmt)
+            ibm_db.free_result(stmt)
+        else:
+            result = pandas.DataFrame({"ROWS": [ibm_db.num_rows(stmt)]})
+        return result
+    finally:
+        pool.release(dsn, conn)
+        
+# Run a statement on several saved connection profiles at once and return the answer sets in one 
+# DataFrame with a SOURCE column that holds the profile name (SOURCE_ if the answer set already has a
+# SOURCE column). At most poolsize targets run at the same time. A target that fails or does not finish
+# within timeout seconds of starting (or that cannot start because the other targets have not finished)
+# is left out of the results, and its error is shown as a warning and kept in df.attrs["errors"], so one
+# slow or broken database does not fail the query. The targets are a list of profile names (None for
+# every profile).
+
+def db2_fanout(sql, parms=None, query=True, targets=None, timeout=60, quiet=False):
+    
+    global settings, poolsize
+    
+    profiles = settings.get("profiles", {})
+    if targets == None: targets = list(profiles.keys())
+    
+    missing = [name for name in targets if name not in profiles]
+    if len(missing) > 0:
+        errormsg("There is no saved connection profile called " + ", ".join(missing) + ". Use CONNECT ... AS name first.")
+        return
+    if len(targets) == 0:
+        errormsg("There are no saved connection profiles. Use CONNECT ... AS name to save one.")
+        return
+    
+    workers = min(len(targets), poolsize)
+    deadline = time.time() + timeout * ((len(targets) + workers - 1) // workers)
+    
+    started = {}
+    futures = {}
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    for name in targets:
+        dsn = db2_dsn(profiles[name])
+        if timeout > 0: dsn = dsn + "CONNECTTIMEOUT={0};".format(int(timeout))
+        futures[name] = executor.submit(db2_fanout_target, name, dsn, sql, parms, query, timeout, started)
+    executor.shutdown(wait=False)
+    
+    results = {}
+    errors = {}
+    pending = dict(futures)
+    while len(pending) > 0:
+        concurrent.futures.wait(list(pending.values()), timeout=0.25, return_when=concurrent.futures.FIRST_COMPLETED)
+        now = time.time()
+        for name, future in list(pending.items()):
+            if future.done():
+                try:
+                    results[name] = future.result()
+                except Exception as err:
+                    errmsg = str(err).replace('\r',' ')
+                    errors[name] = errmsg[errmsg.rfind("]")+1:].strip()
+                del pending[name]
+            elif timeout > 0 and name in started and now - started[name] > timeout:
+                errors[name] = "No answer within {0:g} seconds.".format(timeout)
+                del pending[name]
+            elif timeout > 0 and now > deadline:
+                future.cancel()
+                errors[name] = "Not started because the other targets did not finish."
+                del pending[name]
+                
+    # The profile names go in a SOURCE column unless the answer set already has one, in which case
+    # underscores are added to the name until it is unique
+    
+    source = "SOURCE"
+    while any(source in df.columns for df in results.values()): source = source + "_"
+    
+    frames = []
+    for name in targets:
+        if name not in results: continue
+        df = results[name]
+        df.insert(0, source, name)
+        frames.append(df)
+        
+    if len(frames) > 0:
+        df = pandas.concat(frames, ignore_index=True)
+    else:
+        df = pandas.DataFrame({source: []})
+    df.attrs["errors"] = errors
+    db2_stats_add("rows", len(df))
+    
+    if quiet == False:
+        if source != "SOURCE":
+            db2_warning("The answer set already has a SOURCE column so the profile names are in the " + source + " column.")
+        for name in targets:
+            if name in errors: db2_warning(name + ": " + errors[name])
+            
+    if query == False: db2_result_cache_invalidate(sql)
+            
+    return df
+
+# Run statements in a transaction on the current connection for -tx. Autocommit is turned off and the
+# work is committed every "commit" statements (0 commits once at the end), so a cell of generated INSERT
+# statements does not force the log for every row. If a statement fails the statements since the last 
+# commit are rolled back and the rest of the cell is not run. The statements are (sql, parameter values,
+# True if it returns an answer set). The answer sets are returned in a list.
+
+def db2_transaction(statements, commit=0, quiet=False):
+    
+    global hdbc
+    
+    results = []
+    executed = 0
+    committed = 0
+    commits = 0
+    
+    start = time.time()
+    ibm_db.autocommit(hdbc, ibm_db.SQL_AUTOCOMMIT_OFF)
+    try:
+        for sql, parms, query in statements:
+            db2_stats_start(sql)
+            stmt = db2_exec_once(sql, parms, hdbc)
+            if query == True:
+                results.append(db2_fetch_frame(stmt))
+                ibm_db.free_result(stmt)
+            else:
+                db2_result_cache_invalidate(sql)
+            executed = executed + 1
+            if commit > 0 and executed % commit == 0:
+                ibm_db.commit(hdbc)
+                committed = executed
+                commits = commits + 1
+        ibm_db.commit(hdbc)
+        committed = executed
+        commits = commits + 1
+    except Exception as err:
+        db2_error(quiet)
+        ibm_db.rollback(hdbc)
+        if quiet == False:
+            errormsg("Statement {0} failed. {1} statements were rolled back and {2} were committed.".format(
+                     executed + 1, executed - committed, committed))
+        return
+    finally:
+        ibm_db.autocommit(hdbc, ibm_db.SQL_AUTOCOMMIT_ON)
+        
+    elapsed = time.time() - start
+    if quiet == False:
+        rate = executed / elapsed if elapsed > 0 else 0.0
+        success("{0} statements in {1:.2f} seconds ({2:,.0f} statements/sec) with {3} commits.".format(
+                executed, elapsed, rate, commits))
+        
+    if len(results) > 0: return results
+
+# Background queries that have been started with -bg
+
+backgroundQueries = []
+
+# A statement running in a background thread on its own pooled connection. The status, number of rows 
+# fetched so far and elapsed time can be checked at any time. result() waits for the statement to 
+# finish and cancel() stops it, including the work being done on the Db2 server.
+
+class DB2Background(object):
+    
+    def __init__(self, dsn, sql, parms, query):
+        
+        self.sql = sql
+        self.status = "submitted"
+        self.rows = 0
+        self.error = None
+        self.start = time.time()
+        self.end = None
+        self._dsn = dsn
+        self._parms = parms
+        self._query = query
+        self._result = None
+        self._apphandle = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db2-background")
+        self._thread.daemon = True
+        self._thread.start()
+        
+    @property
+    def elapsed(self):
+        
+        return (self.end or time.time()) - self.start
+    
+    def done(self):
+        
+        return self.status in ["done", "failed", "cancelled"]
+    
+    def _progress(self, count):
+        
+        self.rows = count
+        return not self._cancel.is_set()
+        
+    def _run(self):
+        
+        pool = db2_pool()
+        try:
+            conn = pool.acquire(self._dsn)
+        except Exception as err:
+            self._finish("failed", str(err))
+            return
+        
+        try:
+            try:
+                stmt = ibm_db.exec_immediate(conn, "VALUES MON_GET_APPLICATION_HANDLE()")
+                self._apphandle = ibm_db.fetch_tuple(stmt)[0]
+                ibm_db.free_result(stmt)
+            except Exception:
+                self._apphandle = None
+                
+            self.status = "running"
+            if self._cancel.is_set():
+                self._finish("cancelled")
+                return
+            
+            stmt = db2_exec(self.sql, self._parms, conn)
+            if self._query == True:
+                self.status = "fetching"
+                self._result = db2_fetch_frame(stmt, progress=self._progress)
+                self.rows = len(self._result)
+                ibm_db.free_result(stmt)
+            else:
+                self._result = ibm_db.num_rows(stmt)
+                db2_result_cache_invalidate(self.sql)
+                
+            if self._cancel.is_set() and self._query == True:
+                self._finish("cancelled")
+            else:
+                self._finish("done")
+                
+        except Exception as err:
+            if self._cancel.is_set():
+                self._finish("cancelled")
+            else:
+                self._finish("failed", str(err))
+                
+        finally:
+            pool.release(self._dsn, conn)
+            
+    def _finish(self, status, error=None):
+        
+        if error != None:
+            error = error.replace('\r',' ')
+            self.error = error[error.rfind("]")+1:].strip()
+        self.end = time.time()
+        self.status = status
+        
+    # Wait for the statement to finish and return the DataFrame (or the number of rows changed)
+    
+    def result(self, timeout=None):
+        
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise Exception("The statement is still running after {0} seconds.".format(timeout))
+        if self.status == "failed":
+            raise Exception(self.error)
+        if self.status == "cancelled":
+            raise Exception("The statement was cancelled.")
+        
+        return self._result
+    
+    # Stop the statement. A statement that has not started yet is never run, and fetching stops after the 
+    # current batch. If the statement is still executing, the application is forced off the server through 
+    # another connection so Db2 stops working on it. FORCE APPLICATION needs SYSADM, SYSCTRL or SYSMAINT
+    # authority, so if it fails an error is shown, the statement keeps running and False is returned. An 
+    # INSERT, UPDATE or DELETE that completes anyway is committed and reported as done.
+    
+    def cancel(self):
+        
+        if self.done(): return False
+        
+        self._cancel.set()
+        if self.status != "running": return True
+        
+        unable = "The statement is still running on the server and could not be cancelled: "
+        if self._apphandle is None:
+            errormsg(unable + "the application handle of its connection is not known.")
+            return False
+        
+        pool = db2_pool()
+        try:
+            conn = pool.acquire(self._dsn)
+        except Exception as err:
+            errormsg(unable + str(err))
+            return False
+        try:
+            stmt = ibm_db.exec_immediate(conn, "CALL SYSPROC.ADMIN_CMD('FORCE APPLICATION ({0})')".format(int(self._apphandle)))
+            ibm_db.free_result(stmt)
+        except Exception as err:
+            errmsg = str(err).replace('\r',' ')
+            errormsg(unable + "FORCE APPLICATION (which needs SYSADM, SYSCTRL or SYSMAINT authority) failed. " + 
+                     errmsg[errmsg.rfind("]")+1:].strip())
+            return False
+        finally:
+            pool.release(self._dsn, conn)
+            
+        return True
+    
+    def __repr__(self):
+        
+        text = "Background statement: {0}, {1} rows, {2:.2f} seconds".format(self.status, self.rows, self.elapsed)
+        if self.error != None: text = text + "\n" + self.error
+        
+        return text
+    
+# Start a statement in the background on a connection to the current database
+
+def db2_background(sql, parms=None, query=True):
+    
+    global settings, connections, currentConnection, backgroundQueries
+    
+    if currentConnection in connections:
+        dsn = connections[currentConnection]["dsn"]
+    else:
+        dsn = db2_dsn(settings)
+        
+    handle = DB2Background(dsn, sql, parms, query)
+    backgroundQueries.append(handle)
+    
+    return handle
+
+# List the background statements and their progress
+
+def db2_background_status():
+    
+    global backgroundQueries
+    
+    rows = []
+    for handle in backgroundQueries:
+        rows.append([" ".join(handle.sql.split())[:60], handle.status, handle.rows, handle.elapsed, handle.error])
+        
+    return pandas.DataFrame(rows, columns=["SQL", "STATUS", "ROWS", "SECONDS", "ERROR"])
+
+# Run the same SELECT statement through the native fetch engine and through pandas.read_sql and report
+# the rows/sec of each method
+
+def db2_fetch_compare(sql, parms=None):
+    
+    global hstmt
+    
+    results = []
+    
+    parms = db2_list_tables(parms, hdbc)
+    db2_fetch(sql, parms=parms)
+    results.append(lastFetch)
+    
+    start = time.time()
+    df = pandas.read_sql(sql, hstmt, params=parms or None)
+    results.append(db2_fetch_rate("pandas.read_sql", len(df), time.time() - start))
+    
+    return pandas.DataFrame(results)
+
+# Column types for -compact. Integers are kept in the smallest type that holds the Db2 type, using the
+# pandas nullable integer types when there are NULLs.
+
+db2_compact_ints = {
+     "smallint" : "int16",
+     "int"      : "int32",
+     "bigint"   : "int64"
+}
+
+# Convert one column of a DataFrame to a compact type using its Db2 column descriptor. REAL is stored as
+# float32 and DOUBLE stays float64. DECIMAL stays float64 unless the decimal setting is "scaled", in 
+# which case it is stored as an integer count of 10**-scale units when the precision is small enough 
+# (15 digits) for the float to be exact. DATE and TIMESTAMP become datetime64 unless a value is out of the pandas range. CHAR values, 
+# found because every value is exactly as long as the column, have their padding removed, and strings 
+# with fewer distinct values than the category setting (a fraction of the rows) become categoricals.
+# Returns the column and a note describing the change.
+
+def db2_compact_column(series, column):
+    
+    global settings
+    
+    db2type = db2_result_type(column)
+    notes = []
+    
+    if db2type in db2_compact_ints:
+        dtype = db2_compact_ints[db2type]
+        if series.dtype.kind == "f": dtype = dtype.capitalize()
+        series = series.astype(dtype)
+        
+    elif db2type == "real":
+        series = series.astype("float32")
+        
+    elif db2type in ["decimal", "numeric"] and settings.get("decimal", "float") == "scaled" and 0 < column["precision"] <= 15:
+        scaled = (series * 10 ** column["scale"]).round()
+        series = scaled.astype("Int64" if scaled.isna().any() else "int64")
+        notes.append("scaled by 10**{0}".format(column["scale"]))
+        
+    elif db2type in ["date", "timestamp"] and not pandas.api.types.is_datetime64_any_dtype(series):
+        converted = pandas.to_datetime(series, errors="coerce")
+        if converted.count() == series.count():
+            series = converted
+        else:
+            notes.append("out of range dates kept")
+            
+    elif db2type == "string" and pandas.api.types.is_string_dtype(series):
+        values = series.dropna()
+        if len(values) > 0 and column["precision"] > 0 and (values.str.len() == column["precision"]).all():
+            trimmed = series.str.rstrip(" ")
+            if not trimmed.equals(series): notes.append("padding removed")
+            series = trimmed
+        count = series.count()
+        if count > 0 and series.nunique() <= count * settings.get("category", 0.5):
+            series = series.astype("category")
+            
+    return series, ", ".join(notes)
+
+# Convert the columns of a DataFrame to compact types and return the DataFrame with a report of the 
+# memory used by each column before and after
+
+def db2_compact(df, columns):
+    
+    data = {}
+    report = []
+    for name, column in zip(df.columns, columns):
+        series = df[name]
+        before = series.memory_usage(index=False, deep=True)
+        compact, note = db2_compact_column(series, column)
+        after = compact.memory_usage(index=False, deep=True)
+        data[name] = compact
+        report.append({
+            "COLUMN"    : name,
+            "DB2 TYPE"  : column["type"],
+            "BEFORE"    : str(series.dtype),
+            "AFTER"     : str(compact.dtype),
+            "BEFORE MB" : before / 1048576,
+            "AFTER MB"  : after / 1048576,
+            "NOTE"      : note
+        })
+        
+    report = pandas.DataFrame(report)
+    total = {"COLUMN": "Total", "BEFORE MB": report["BEFORE MB"].sum(), "AFTER MB": report["AFTER MB"].sum()}
+    report = pandas.concat([report, pandas.DataFrame([total])], ignore_index=True).fillna("")
+    
+    df = pandas.DataFrame(data, index=df.index)
+    df.columns = [column["name"] for column in columns]
+    
+    return df, report
+
+# Fetch the whole answer set of a query with compact column types for -compact and display the memory
+# report unless quiet is True
+
+def db2_fetch_compact(sql, parms=None, quiet=False):
+    
+    start = time.time()
+    stmt = db2_exec(sql, parms)
+    columns = db2_columns(stmt)
+    df = db2_fetch_frame(stmt, -1, columns)
+    ibm_db.free_result(stmt)
+    
+    converted = time.time()
+    df, report = db2_compact(df, columns)
+    db2_stats_add("convert", time.time() - converted)
+    db2_fetch_rate("compact", len(df), time.time() - start)
+    
+    if quiet == False:
+        pDisplay(report.round({"BEFORE MB": 2, "AFTER MB": 2}))
+        
+    return df
+
+# Describe the answer set of a statement without running it
+
+def db2_describe(sql):
+    
+    global hdbc
+    
+    db2_preview_close(hdbc)
+    stmt = ibm_db.prepare(hdbc, sql)
+    columns = db2_columns(stmt)
+    ibm_db.free_stmt(stmt)
+    
+    return columns
+
+# Find the schema of the explain tables, creating them in SYSTOOLS if they do not exist
+
+def db2_explain_schema():
+    
+    global hdbc
+    
+    stmt = db2_exec_once("SELECT TABSCHEMA FROM SYSCAT.TABLES WHERE TABNAME = 'EXPLAIN_INSTANCE' "
+                         "AND TABSCHEMA IN (USER, 'SYSTOOLS') ORDER BY CASE WHEN TABSCHEMA = USER THEN 0 ELSE 1 END", None, hdbc)
+    row = ibm_db.fetch_tuple(stmt)
+    ibm_db.free_result(stmt)
+    if row: return row[0].strip()
+    
+    db2_exec_once("CALL SYSPROC.SYSINSTALLOBJECTS('EXPLAIN', 'C', CAST(NULL AS VARCHAR(128)), CAST(NULL AS VARCHAR(128)))", None, hdbc)
+    return "SYSTOOLS"
+
+# Explain a statement and return its access plan: one row per operator with the operator it feeds, the 
+# table or index it reads, its estimated costs (timerons) and the estimated number of rows it returns. 
+# Unless execute is False the statement is then run and all of its rows fetched, so the actual runtime
+# is shown next to the estimate and added to the history.
+
+def db2_explain(sql, parms=None, execute=True, quiet=False):
+    
+    global hdbc, settings
+    
+    event = getattr(statementEvent, "event", None)
+    statementEvent.event = None
+    try:
+        parms = db2_list_tables(parms, hdbc)
+        schema = db2_explain_schema()
+        db2_exec_once("EXPLAIN PLAN FOR " + sql, None, hdbc)
+        keys = "{0}.EXPLAIN_TIME = O.EXPLAIN_TIME AND {0}.EXPLAIN_REQUESTER = O.EXPLAIN_REQUESTER AND " \
+               "{0}.STMTNO = O.STMTNO AND {0}.SECTNO = O.SECTNO"
+        plan = db2_fetch(
+            "SELECT O.OPERATOR_ID AS ID, S.TARGET_ID AS PARENT, O.OPERATOR_TYPE AS OPERATOR, "
+            "(SELECT MIN(RTRIM(D.OBJECT_SCHEMA) || '.' || D.OBJECT_NAME) FROM {0}.EXPLAIN_STREAM D "
+            " WHERE D.SOURCE_TYPE = 'D' AND D.TARGET_ID = O.OPERATOR_ID AND {1}) AS OBJECT, "
+            "O.TOTAL_COST, O.IO_COST, O.CPU_COST, O.FIRST_ROW_COST, S.STREAM_COUNT AS CARDINALITY "
+            "FROM {0}.EXPLAIN_OPERATOR O LEFT JOIN {0}.EXPLAIN_STREAM S "
+            "ON S.SOURCE_TYPE = 'O' AND S.SOURCE_ID = O.OPERATOR_ID AND {2} "
+            "WHERE O.EXPLAIN_REQUESTER = USER AND O.EXPLAIN_TIME = "
+            "(SELECT MAX(EXPLAIN_TIME) FROM {0}.EXPLAIN_INSTANCE WHERE EXPLAIN_REQUESTER = USER) "
+            "ORDER BY O.OPERATOR_ID".format(schema, keys.format("D"), keys.format("S")))
+    finally:
+        statementEvent.event = event
+        
+    cost = float(plan["TOTAL_COST"].max()) if len(plan) > 0 else None
+    with historyLock:
+        db2_history_entry(db2_history_key(sql), sql)["cost"] = cost
+        
+    limit = settings.get("costlimit", 0)
+    if cost != None and limit > 0 and cost > limit:
+        db2_warning("The estimated cost of {0:,.0f} timerons is over the limit of {1:,.0f}.".format(cost, limit))
+        
+    if execute == False:
+        statementEvent.event = None
+        return plan
+    
+    start = time.time()
+    stmt = db2_exec(sql, parms)
+    rows = 0
+    if ibm_db.num_fields(stmt) > 0:
+        fetched = time.time()
+        batch = db2_fetchmany(stmt, fetchsize)
+        while len(batch) > 0:
+            rows = rows + len(batch)
+            batch = db2_fetchmany(stmt, fetchsize)
+        db2_stats_add("fetch", time.time() - fetched)
+        ibm_db.free_result(stmt)
+    else:
+        rows = ibm_db.num_rows(stmt)
+        db2_result_cache_invalidate(sql)
+    db2_stats_add("rows", rows)
+    elapsed = time.time() - start
+    
+    if quiet == False:
+        success("Estimated cost {0:,.0f} timerons. Actual: {1} rows in {2:.3f} seconds.".format(cost or 0, rows, elapsed))
+        
+    return plan
+
+# Plot the top categories of a bar or pie chart. The y values are summed for each x value in Db2, the
+# "top" largest are kept in their original order and everything else is added up as "Other", so only
+# top + 1 rows are returned no matter how large the answer set is.
+
+def db2_plot_categories(sql, parms, columns, top, fetch):
+    
+    names = ", ".join("C" + str(col + 1) for col in range(len(columns)))
+    label = "C1" if columns[0]["type"] == "string" else "VARCHAR(C1)"
+    
+    plot = ("WITH T ({0}) AS ({1}), "
+            "S AS (SELECT C1, C2, ROW_NUMBER() OVER () AS SEQ FROM T), "
+            "G AS (SELECT {2} AS X, SUM(C2) AS Y, MIN(SEQ) AS SEQ FROM S GROUP BY {2}), "
+            "R AS (SELECT X, Y, SEQ, ROW_NUMBER() OVER (ORDER BY Y DESC, SEQ) AS N FROM G) "
+            "SELECT CASE WHEN N <= {3} THEN X ELSE 'Other' END AS X, SUM(Y) AS Y FROM R "
+            "GROUP BY CASE WHEN N <= {3} THEN X ELSE 'Other' END "
+            "ORDER BY MIN(CASE WHEN N <= {3} THEN 0 ELSE 1 END), MIN(SEQ)").format(names, sql, label, top)
+    
+    df = fetch(plot, parms)
+    df.columns = [columns[0]["name"], columns[1]["name"]]
+    
+    return df
+
+# Plot a line chart from at most "points" buckets. The range of x is split into equal buckets in Db2 and
+# the first x and the average y of each bucket are returned. The range is found in the same statement, so 
+# the query only runs once, and the largest x is kept in the last bucket. Dates and timestamps are 
+# bucketed by the number of days or seconds. If there are no more rows than points, or every x is the
+# same, the answer set is fetched as is. Nothing is returned if the x or y values cannot be bucketed.
+
+def db2_plot_bins(sql, parms, columns, points, fetch):
+    
+    if columns[1]["type"] not in db2_numeric: return None
+    
+    if columns[0]["type"] in db2_numeric:
+        x = "C1"
+    elif columns[0]["type"] == "date":
+        x = "DAYS(C1)"
+    elif columns[0]["type"] == "timestamp":
+        x = "(DAYS(C1) * 86400.0 + MIDNIGHT_SECONDS(C1))"
+    else:
+        return None
+    
+    names = ", ".join("C" + str(col + 1) for col in range(len(columns)))
+    
+    bucket = "LEAST(CAST(({0} - B.LOW) * {1} / NULLIF(B.HIGH - B.LOW, 0) AS INTEGER), {2})".format(x, points, points - 1)
+    plot = ("WITH T ({0}) AS ({1}), "
+            "B (LOW, HIGH, N) AS (SELECT MIN(CAST({2} AS DOUBLE)), MAX(CAST({2} AS DOUBLE)), COUNT(*) FROM T) "
+            "SELECT MIN(C1), AVG(CAST(C2 AS DOUBLE)), MAX(B.N), MAX(B.LOW), MAX(B.HIGH) FROM T, B WHERE C1 IS NOT NULL "
+            "GROUP BY {3} ORDER BY 1").format(names, sql, x, bucket)
+    
+    df = fetch(plot, parms)
+    if len(df) == 0 or df.iloc[0, 2] <= points or df.iloc[0, 3] == df.iloc[0, 4]: return fetch(sql, parms)
+    
+    df = df.iloc[:, :2]
+    df.columns = [columns[0]["name"], columns[1]["name"]]
+    
+    return df
+
+# Largest-Triangle-Three-Buckets downsampling. Returns the positions of "points" rows that keep the shape
+# of the line: the first and last rows and, from each bucket in between, the row that forms the largest
+# triangle with the row chosen before it and the average of the next bucket.
+
+def db2_lttb(x, y, points):
+    
+    rows = len(x)
+    if points < 3 or rows <= points: return numpy.arange(rows)
+    
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    
+    buckets = numpy.array_split(numpy.arange(1, rows - 1), points - 2)
+    selected = numpy.empty(points, dtype=numpy.int64)
+    selected[0] = 0
+    selected[-1] = rows - 1
+    
+    chosen = 0
+    for index, bucket in enumerate(buckets):
+        following = buckets[index + 1] if index + 1 < len(buckets) else [rows - 1]
+        avgx = x[following].mean()
+        avgy = y[following].mean()
+        area = numpy.abs((x[chosen] - avgx) * (y[bucket] - y[chosen]) - (x[chosen] - x[bucket]) * (avgy - y[chosen]))
+        chosen = bucket[numpy.nanargmax(area)] if not numpy.isnan(area).all() else bucket[0]
+        selected[index + 1] = chosen
+    
+    return selected
+
+# Retrieve the data for a plot. Bar and pie charts keep the "top" categories (0 for all rows) and line
+# charts are reduced to "points" rows (0 for all rows), either by bucketing in Db2 (method=bins) or by LTTB
+# downsampling of the full answer set (method=lttb). If the statement cannot be rewritten, for instance
+# because it starts with WITH, the full answer set is fetched and line charts are downsampled with LTTB.
+
+def db2_plot_data(sql, parms, plot, options, fetch):
+    
+    keywords = sql.split()
+    pushdown = len(keywords) > 0 and keywords[0].upper() in ["SELECT", "VALUES"]
+    method = options.get("method", "bins").lower()
+    
+    if plot in [1, 2]:
+        top = int(options.get("top", 20 if plot == 1 else 10))
+        if pushdown == True and top > 0:
+            try:
+                columns = db2_describe(sql)
+                if len(columns) >= 2 and columns[1]["type"] in db2_numeric:
+                    return db2_plot_categories(sql, parms, columns, top, fetch)
+            except Exception:
+                pass
+        return fetch(sql, parms)
+    
+    points = int(options.get("points", 1000))
+    if points <= 0 or method == "none": return fetch(sql, parms)
+    
+    if pushdown == True and method == "bins":
+        try:
+            columns = db2_describe(sql)
+            if len(columns) >= 2:
+                df = db2_plot_bins(sql, parms, columns, points, fetch)
+                if df is not None: return df
+        except Exception:
+            pass
+    
+    df = fetch(sql, parms)
+    if len(df) <= points: return df
+    
+    if len(df.columns) >= 2:
+        x = df.iloc[:, 0]
+        if x.dtype.kind == "M":
+            x = x.astype("int64")
+        elif x.dtype.kind not in "iuf":
+            x = numpy.arange(len(df))
+        y = df.iloc[:, 1]
+    else:
+        x = numpy.arange(len(df))
+        y = df.iloc[:, 0]
+    
+    if y.dtype.kind not in "iuf": return df
+    
+    return df.iloc[db2_lttb(x, y, points)].reset_index(drop=True)
+
+# Run a statement repeatedly on one connection for the benchmark. The warm-up executions are not 
+# recorded. Each measured execution records the execute and fetch times in seconds. The proceed() function
+# returns False when the worker should stop.
+
+def db2_benchmark_worker(dsn, sql, parms, query, mode, warmup, proceed, samples, errors):
+    
+    global fetchsize
+    
+    pool = db2_pool()
+    try:
+        conn = pool.acquire(dsn)
+    except Exception as err:
+        errors.append(str(err))
+        return
+    
+    try:
+        parms = tuple(db2_list_tables(parms, conn) or [])
+        if mode == "prepared": stmt = ibm_db.prepare(conn, sql)
+        iteration = 0
+        while True:
+            if iteration >= warmup and proceed() == False: break
+            
+            start = time.perf_counter()
+            if mode == "prepared":
+                ibm_db.execute(stmt, parms)
+            elif len(parms) > 0:
+                stmt = ibm_db.prepare(conn, sql)
+                ibm_db.execute(stmt, parms)
+            else:
+                stmt = ibm_db.exec_immediate(conn, sql)
+            executed = time.perf_counter()
+            
+            rows = 0
+            if query == True:
+                while True:
+                    batch = db2_fetchmany(stmt, fetchsize)
+                    rows = rows + len(batch)
+                    if len(batch) < fetchsize: break
+                ibm_db.free_result(stmt)
+            fetched = time.perf_counter()
+            
+            if iteration >= warmup: samples.append((executed - start, fetched - executed, rows))
+            iteration = iteration + 1
+            
+    except Exception as err:
+        errors.append(str(err))
+    finally:
+        pool.release(dsn, conn)
         
-        count = count + 1
+# Summarize the latencies of a benchmark run in milliseconds
+
+def db2_benchmark_summary(sql, mode, workers, started, elapsed, samples, errors):
+    
+    summary = {
+        "SQL"        : " ".join(sql.split()),
+        "STARTED"    : started,
+        "MODE"       : mode,
+        "WORKERS"    : workers,
+        "RUNS"       : len(samples),
+        "ERRORS"     : len(errors),
+        "SECONDS"    : elapsed,
+        "RUNS/SEC"   : len(samples) / elapsed if elapsed > 0 else 0.0,
+        "ROWS/SEC"   : sum(sample[2] for sample in samples) / elapsed if elapsed > 0 else 0.0
+    }
+    
+    if len(samples) > 0:
+        timings = numpy.array([(sample[0], sample[1], sample[0] + sample[1]) for sample in samples]) * 1000.0
+    else:
+        timings = numpy.full((1, 3), numpy.nan)
         
-    return(count)
+    for col, phase in enumerate(["EXEC", "FETCH", "TOTAL"]):
+        p50, p95, p99 = numpy.percentile(timings[:, col], [50, 95, 99])
+        summary[phase + "_P50_MS"] = p50
+        summary[phase + "_P95_MS"] = p95
+        summary[phase + "_P99_MS"] = p99
+        summary[phase + "_MAX_MS"] = numpy.max(timings[:, col])
+        
+    return summary
+
+# Benchmark a statement. Each worker thread runs the statement on its own pooled connection, first for
+# "warmup" executions and then until "runs" executions have been done in total, or for "duration" seconds 
+# if runs is 0. The mode is prepared (prepare once, execute many), immediate (compile on every execution)
+# or both. One row is returned for each mode so that results can be saved and compared between runs.
+
+def db2_benchmark(sql, parms=None, query=True, workers=1, runs=0, duration=None, warmup=5, mode="both"):
+    
+    global settings, connections, currentConnection, runtime
+    
+    if currentConnection in connections:
+        dsn = connections[currentConnection]["dsn"]
+    else:
+        dsn = db2_dsn(settings)
+        
+    if duration == None: duration = runtime
+    if mode == "both":
+        modes = ["prepared", "immediate"]
+    else:
+        modes = [mode]
+        
+    results = []
+    for mode in modes:
+        
+        samples = []
+        errors = []
+        lock = threading.Lock()
+        counter = [0]
+        started = [None]
+        
+        # The clock starts when the first worker finishes warming up
+        
+        def proceed():
+            with lock:
+                if started[0] == None: started[0] = time.perf_counter()
+                if runs > 0:
+                    if counter[0] >= runs: return False
+                    counter[0] = counter[0] + 1
+                    return True
+            return time.perf_counter() - started[0] < duration
+            
+        timestamp = pandas.Timestamp.now()
+        threads = []
+        for worker in range(workers):
+            thread = threading.Thread(target=db2_benchmark_worker, name="db2-benchmark",
+                                      args=(dsn, sql, parms, query, mode, warmup, proceed, samples, errors))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+            
+        for thread in threads: thread.join()
+        
+        elapsed = time.perf_counter() - started[0] if started[0] != None else 0.0
+        results.append(db2_benchmark_summary(sql, mode, workers, timestamp, elapsed, samples, errors))
+        
+        if len(errors) > 0:
+            errmsg = errors[0].replace('\r',' ')
+            errormsg(errmsg[errmsg.rfind("]")+1:].strip())
+            
+    return pandas.DataFrame(results)
+
+# Quote a column name for Db2. Regular identifiers are folded to uppercase just like Db2 does for 
+# unquoted names so the columns can be used without quotes afterwards.
+
+def db2_column_name(name):
+    
+    name = str(name)
+    if re.match(r'^[A-Za-z_][\w$#@]*$', name): name = name.upper()
+    
+    return '"' + name.replace('"', '""') + '"'
+
+# Pick a Db2 column type for a DataFrame column
+
+def db2_column_type(series):
+    
+    dtype = series.dtype
+    
+    if pandas.api.types.is_bool_dtype(dtype): return "SMALLINT"
+    if pandas.api.types.is_integer_dtype(dtype):
+        if dtype.itemsize <= 2: return "SMALLINT"
+        if dtype.itemsize <= 4: return "INTEGER"
+        return "BIGINT"
+    if pandas.api.types.is_float_dtype(dtype): return "DOUBLE"
+    if pandas.api.types.is_datetime64_any_dtype(dtype): return "TIMESTAMP"
+    
+    values = series.dropna()
+    if len(values) > 0:
+        sample = values.iloc[0]
+        if isinstance(sample, datetime.datetime): return "TIMESTAMP"
+        if isinstance(sample, datetime.date): return "DATE"
+        if isinstance(sample, datetime.time): return "TIME"
+        if isinstance(sample, decimal.Decimal): return "DECFLOAT"
+        if isinstance(sample, (bytes, bytearray)): return "BLOB"
+        
+    length = 1
+    if len(values) > 0:
+        length = max(1, int(values.astype(str).str.encode("utf-8").str.len().max()))
+    if length > 32672: return "CLOB(" + str(length) + ")"
+    
+    return "VARCHAR(" + str(length) + ")"
+
+# Convert a DataFrame column into a list of Python values that ibm_db can bind. Missing values become
+# None and timestamps are passed as strings in a format Db2 accepts.
+
+def db2_column_values(series):
+    
+    dtype = series.dtype
+    missing = series.isna()
+    
+    if pandas.api.types.is_bool_dtype(dtype):
+        values = [None if pandas.isna(value) else int(value) for value in series.astype(object).tolist()]
+    elif pandas.api.types.is_datetime64_any_dtype(dtype):
+        values = series.dt.strftime("%Y-%m-%d %H:%M:%S.%f").tolist()
+    elif pandas.api.types.is_integer_dtype(dtype) or pandas.api.types.is_float_dtype(dtype):
+        values = series.astype(object).tolist()
+    else:
+        values = [value if isinstance(value, (str, bytes, bytearray)) else str(value) for value in series.tolist()]
+        
+    if missing.any():
+        for row in numpy.flatnonzero(missing.to_numpy()): values[row] = None
+        
+    return values
+
+# Check if a table exists. A name without a schema is looked up in the current schema.
+
+def db2_table_exists(table):
+    
+    global hdbc
+    
+    parts = table.split(".")
+    if len(parts) > 1:
+        schema = "'" + parts[0].strip('"').upper() + "'"
+    else:
+        schema = "CURRENT SCHEMA"
+        
+    stmt = db2_exec_once("SELECT COUNT(*) FROM SYSCAT.TABLES WHERE TABSCHEMA = {0} AND TABNAME = '{1}'".format(
+                         schema, parts[-1].strip('"').upper()), None, hdbc)
+    exists = ibm_db.fetch_tuple(stmt)[0] > 0
+    ibm_db.free_result(stmt)
+    
+    return exists
+
+# Load a DataFrame into a Db2 table with array inserts. The table is created if it does not exist and 
+# create is True. Rows are inserted "batch" rows at a time and committed every "commit" rows. If an error
+# occurs the uncommitted rows are rolled back. The number of rows loaded is returned.
+
+def db2_load(df, table, create=True, batch=None, commit=None, quiet=False):
+    
+    global hdbc, loadbatch, loadcommit
+    
+    if batch == None: batch = loadbatch
+    if commit == None: commit = loadcommit
+    
+    db2_preview_close(hdbc)
+    start = time.time()
+    
+    names = [db2_column_name(name) for name in df.columns]
+    
+    if create == True:
+        if db2_table_exists(table) == False:
+            columns = ", ".join(name + " " + db2_column_type(df[column]) for name, column in zip(names, df.columns))
+            db2_exec_once("CREATE TABLE " + table + " (" + columns + ")", None, hdbc)
+            
+    insert = "INSERT INTO " + table + " (" + ", ".join(names) + ") VALUES (" + ", ".join(["?"] * len(names)) + ")"
+    stmt = ibm_db.prepare(hdbc, insert)
+    
+    ibm_db.autocommit(hdbc, ibm_db.SQL_AUTOCOMMIT_OFF)
+    rows = 0
+    uncommitted = 0
+    try:
+        for first in range(0, len(df), batch):
+            part = df.iloc[first:first+batch]
+            values = tuple(zip(*[db2_column_values(part[column]) for column in part.columns]))
+            ibm_db.execute_many(stmt, values)
+            rows = rows + len(values)
+            uncommitted = uncommitted + len(values)
+            if uncommitted >= commit:
+                ibm_db.commit(hdbc)
+                uncommitted = 0
+        ibm_db.commit(hdbc)
+    except Exception:
+        ibm_db.rollback(hdbc)
+        raise
+    finally:
+        ibm_db.autocommit(hdbc, ibm_db.SQL_AUTOCOMMIT_ON)
+        db2_result_cache_invalidate(insert)
+        
+    elapsed = time.time() - start
+    if quiet == False:
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        success("{0} rows loaded into {1} in {2:.2f} seconds ({3:,.0f} rows/sec).".format(rows, table, elapsed, rate))
+    
+    return rows
+
+# Arrow types of the Db2 column types for -out. Other column types are written as strings. DECIMAL is 
+# written as an Arrow decimal128 with the precision and scale of the column (see db2_arrow_type).
+
+db2_arrow = {
+     "smallint"  : "int16",
+     "int"       : "int32",
+     "bigint"    : "int64",
+     "real"      : "float32",
+     "double"    : "float64",
+     "decimal"   : "float64",
+     "numeric"   : "float64",
+     "decfloat"  : "float64",
+     "date"      : "date32",
+     "time"      : "time64[us]",
+     "timestamp" : "timestamp[us]",
+     "blob"      : "binary",
+     "binary"    : "binary",
+     "boolean"   : "bool"
+}
+
+# Return the Arrow type of a Db2 column. SMALLINT and REAL are found from the precision of the column, and
+# DECIMAL keeps its precision and scale unless it has more digits than decimal128 can hold.
+
+def db2_arrow_type(pyarrow, column):
+    
+    db2type = db2_result_type(column)
+    if db2type in ["decimal", "numeric"] and 0 < column["precision"] <= 38:
+        return pyarrow.decimal128(column["precision"], column["scale"])
+    
+    return pyarrow.type_for_alias(db2_arrow.get(db2type, "string"))
+
+# Convert the values of one column in a batch into an Arrow array. Numbers go through the same NumPy 
+# buffers as DataFrames, with NaN written as null. DECIMAL values, which the driver returns as strings, are
+# converted to Decimal so no digits are lost. Dates and times that the driver returns as strings are
+# converted by Arrow.
+
+def db2_arrow_array(pyarrow, values, column):
+    
+    arrowtype = db2_arrow_type(pyarrow, column)
+    db2type = db2_result_type(column)
+    
+    if pyarrow.types.is_decimal(arrowtype):
+        values = [None if value is None else decimal.Decimal(str(value)) for value in values]
+        return pyarrow.array(values, type=arrowtype)
+    if db2type in db2_numeric:
+        return pyarrow.array(db2_column_buffer(values, db2type), from_pandas=True).cast(arrowtype)
+    if db2type not in db2_arrow:
+        values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        
+    try:
+        return pyarrow.array(values, type=arrowtype)
+    except (TypeError, ValueError):
+        return pyarrow.array(values, type=pyarrow.string()).cast(arrowtype)
+
+# Write the answer set of a query to a Parquet, Feather (Arrow IPC) or CSV file. Rows are fetched in 
+# batches of fetchsize and each batch is written as soon as it arrives, so only the batches in the 
+# prefetch queue are in memory at a time. The column types of Parquet and Feather files come from the Db2 column types. 
+# Returns the number of rows written.
+
+def db2_export(sql, path, parms=None, quiet=False):
+    
+    extension = os.path.splitext(path)[1].lower()
+    if extension in [".parquet", ".pq"]:
+        form = "parquet"
+    elif extension in [".feather", ".arrow", ".ipc"]:
+        form = "feather"
+    elif extension == ".csv":
+        form = "csv"
+    else:
+        errormsg("The -out file must end in .parquet, .feather, .arrow or .csv.")
+        return
+    
+    if form != "csv":
+        try:
+            pyarrow = importlib.import_module("pyarrow")
+            importlib.import_module("pyarrow.parquet" if form == "parquet" else "pyarrow.ipc")
+        except ImportError:
+            errormsg("Writing Parquet and Feather files needs pyarrow. Install it with !pip install pyarrow")
+            return
+    
+    start = time.time()
+    stmt = db2_exec(sql, parms)
+    columns = db2_columns(stmt)
+    names = [column["name"] for column in columns]
+    
+    rows = 0
+    batches = db2_batches(stmt)
+    if form == "csv":
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(names)
+                for batch in batches:
+                    writer.writerows(batch)
+                    rows = rows + len(batch)
+        finally:
+            batches.close()
+    else:
+        schema = pyarrow.schema([(column["name"], db2_arrow_type(pyarrow, column)) for column in columns])
+        if form == "parquet":
+            writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            writer = pyarrow.ipc.new_file(path, schema)
+        try:
+            for batch in batches:
+                arrays = [db2_arrow_array(pyarrow, values, column) for values, column in zip(zip(*batch), columns)]
+                table = pyarrow.Table.from_arrays(arrays, schema=schema)
+                writer.write_table(table)
+                rows = rows + len(batch)
+        finally:
+            batches.close()
+            writer.close()
+            
+    ibm_db.free_result(stmt)
+    db2_stats_add("rows", rows)
+    
+    elapsed = time.time() - start
+    size = os.path.getsize(path)
+    if quiet == False:
+        rate = elapsed if elapsed > 0 else 1
+        success("{0} rows written to {1} ({2:,.1f} MB) in {3:.2f} seconds ({4:,.0f} rows/sec, {5:,.1f} MB/sec).".format(
+                rows, path, size / 1048576, elapsed, rows / rate, size / 1048576 / rate))
+        
+    return rows
+
+# Run a SQL script one statement at a time while it is being read. Queries display their first maxrows
+# rows and the rest of the answer set is counted but not kept. Errors are reported and the script carries
+# on with the next statement. Progress is updated in place about once a second and a DataFrame with the
+# line number, rows, elapsed time and error of every statement is returned.
+
+def db2_run_script(lines, delimiter=";", namespace=None, quiet=False, maxrows=10):
+    
+    global hdbc
+    
+    if namespace == None: namespace = {}
+    
+    results = []
+    errors = 0
+    start = time.time()
+    shown = start
+    progress = None
+    if quiet == False:
+        progress = pDisplay(pHTML("<p>Running script...</p>"), display_id=True)
+    
+    for lineno, sql in db2_split(lines, delimiter):
+        
+        keywords = sql.split()
+        sqlcmd = keywords[0].upper()
+        
+        parms = []
+        if sqlcmd in bindable:
+            sql, parms = db2_bind_vars(sql, namespace)
+            
+        db2_stats_start(sql)
+        
+        rows = 0
+        error = None
+        began = time.time()
+        try:
+            stmt = db2_exec(sql, parms)
+            if ibm_db.num_fields(stmt) > 0:
+                df = db2_fetch_frame(stmt, maxrows) if maxrows != 0 else None
+                rows = 0 if df is None else len(df)
+                fetched = time.time()
+                batch = db2_fetchmany(stmt, fetchsize)
+                while len(batch) > 0:
+                    rows = rows + len(batch)
+                    db2_stats_add("rows", len(batch))
+                    batch = db2_fetchmany(stmt, fetchsize)
+                db2_stats_add("fetch", time.time() - fetched)
+                if quiet == False and df is not None: pDisplay(df)
+            else:
+                rows = ibm_db.num_rows(stmt)
+                db2_result_cache_invalidate(sql)
+        except Exception as err:
+            errmsg = str(err).replace('\r',' ')
+            error = errmsg[errmsg.rfind("]")+1:].strip()
+            db2_stats_error(error)
+            errors = errors + 1
+            if quiet == False: errormsg("Line " + str(lineno) + ": " + error)
+        
+        results.append([len(results) + 1, lineno, " ".join(keywords)[:80], rows, time.time() - began, error])
+        
+        if progress is not None and time.time() - shown >= 1:
+            shown = time.time()
+            progress.update(pHTML("<p>Running script: {0} statements ({1} errors) in {2:.1f} seconds, line {3}</p>".format(
+                                  len(results), errors, shown - start, lineno)))
+    
+    elapsed = time.time() - start
+    if progress is not None:
+        progress.update(pHTML("<p>Script complete: {0} statements ({1} errors) in {2:.2f} seconds</p>".format(
+                              len(results), errors, elapsed)))
+    
+    return pandas.DataFrame(results, columns=["STATEMENT", "LINE", "SQL", "ROWS", "SECONDS", "ERROR"])
 
 # Print out the DB2 error generated by the last executed statement
 
 def db2_error(quiet):
     
+    errmsg = ibm_db.stmt_errormsg().replace('\r',' ')
+    errmsg = errmsg[errmsg.rfind("]")+1:].strip()
+    db2_stats_error(errmsg)
+    
     if quiet == True: return
 
     html = '<p style="border:2px; border-style:solid; border-color:#FF0000; background-color:#ffe6e6; padding: 1em;">'
 
-    errmsg = ibm_db.stmt_errormsg().replace('\r',' ')
-    errmsg = errmsg[errmsg.rfind("]")+1:].strip()
     pDisplay(pHTML(html+errmsg+"</p>"))
     
+# Print out a warning message
+
+def db2_warning(message):
+    
+    html = '<p style="border:2px; border-style:solid; border-color:#FFA500; background-color:#fff5e6; padding: 1em;">'
+    pDisplay(pHTML(html + message + "</p>"))
+    
 # Print out an error message
 
 def errormsg(message):
@@ -654,8 +4098,6 @@ def success(message):
         
 @magics_class
 class DB2(Magics):
-      
-    import pixiedust  
     
     @line_cell_magic
     def sql(self, line, cell=None):
@@ -667,7 +4109,7 @@ class DB2(Magics):
         # If your statement is not a connect, and you haven't connected, we need to do it for you
     
         global settings 
-        global hdbc, hstmt, connected
+        global hdbc, hstmt, connected, connections, currentConnection
         
         select = ["SELECT", "WITH", "VALUES"] 
         noBlock = 0
@@ -681,12 +4123,25 @@ class DB2(Magics):
         flag_sqlType = noBlock
         flag_quiet = False
         flag_json = False
+        flag_jsonpaths = None
+        flag_plotoptions = {}
         flag_timer = False
         flag_plot = 0
         flag_cell = False
         flag_output = False
         flag_resultset = False
         flag_dataframe = False
+        flag_compare = False
+        flag_compact = False
+        flag_chunk = 0
+        flag_all = False
+        flag_cache = settings.get("cache", False)
+        flag_parallel = 0
+        flag_background = False
+        flag_bench = None
+        flag_tx = None
+        flag_fanout = None
+        flag_incremental = None
         
         # The parameters must be in the line, not in the cell i.e. %sql -c 
         
@@ -710,6 +4165,32 @@ class DB2(Magics):
             connected_help()
             return
         
+        # Show the statistics of the recent statements, or clear them with -stats reset
+        if Parms.lower() == "-stats":
+            return(db2_stats())
+        
+        if Parms.lower() == "-stats reset":
+            statementStats.clear()
+            return
+        
+        # Show the runtime history of the statements that have been run
+        if Parms.lower() == "-history":
+            return(db2_history_stats())
+        
+        # Run the statement on a named connection and then switch back to the current connection
+        Parms, name = getOption(Parms, "-c")
+        if name != None:
+            name = name.upper()
+            if name not in connections:
+                errormsg("There is no connection named " + name + ". Use CONNECT ... AS " + name + " first.")
+                return
+            previous = currentConnection
+            if db2_switch(name) == False: return
+            try:
+                return self.sql(Parms, cell)
+            finally:
+                if previous != None and previous in connections: db2_switch(previous)
+        
         # If you issue a CONNECT statement in %sql then we run this first before auto-connecting
         if findKeyword(Parms,"CONNECT") == True: 
             parseConnect(Parms)
@@ -726,21 +4207,164 @@ class DB2(Magics):
         else:
             pandas.options.display.max_rows = settings["maxrows"]
       
+        # Run a SQL script file: -f path. The path is removed first so that it is not mistaken for other flags.
+        Parms, flag_script = getOption(Parms, "-f")
+        
+        # Write the answer set to a file: -out path.parquet|.feather|.csv
+        Parms, flag_out = getOption(Parms, "-out")
+        
+        # Flatten JSON documents into a DataFrame: -j table [path=field,field...]
+        json_table = re.search(r'(^|\s)-j\s+table(?:\s+path=(\S+))?(?=\s|$)', Parms, flags=re.I)
+        if json_table != None:
+            flag_json = "table"
+            if json_table.group(2) != None: flag_jsonpaths = json_table.group(2).split(",")
+            Parms = Parms[:json_table.start()] + " " + Parms[json_table.end():]
+            
         # Display rows as JSON structure
         if Parms.find("-j") >= 0:
             flag_json = True
             Parms = Parms.replace("-j"," ")
           
+        # Load a DataFrame into a table: -load df TABLE [batch=N] [commit=N] [create=yes|no]
+        load = re.search(r'(^|\s)-load\s+(\w+)\s+(\S+)((?:\s+(?:batch|commit|create)=\S+)*)', Parms, flags=re.I)
+        if load != None:
+            name = load.group(2)
+            if name not in self.shell.user_ns:
+                errormsg("The variable " + name + " is not defined.")
+                return
+            options = dict(setting.lower().split("=", 1) for setting in load.group(4).split())
+            try:
+                batch = int(options["batch"]) if "batch" in options else None
+                commit = int(options["commit"]) if "commit" in options else None
+            except ValueError:
+                errormsg("The -load batch and commit settings must be numbers.")
+                return
+            try:
+                db2_load(self.shell.user_ns[name], load.group(3), options.get("create", "yes") != "no", batch, commit, Parms.find("-q") >= 0)
+            except Exception as err:
+                db2_error(False)
+            return
+        
         # Load sample tables for scripts
-        if Parms.find('-sampledata') >= 0:
-            db2_create_sample()
+        Parms, sample = getOptionSettings(Parms, "-sampledata", ["scale", "seed", "fact", "replace"])
+        if sample != None:
+            if len(sample) == 0:
+                db2_create_sample()
+                return
+            try:
+                scale = int(sample.get("scale", 1))
+                seed = int(sample.get("seed", 2017))
+                fact = int(sample.get("fact", 0))
+            except ValueError:
+                errormsg("The -sampledata settings SCALE, SEED and FACT must be numbers.")
+                return
+            try:
+                db2_generate_sample(scale, seed, fact, sample.get("replace", "no").upper() == "YES")
+            except Exception as err:
+                db2_error(False)
             return
         
+        # Return the answer set as a generator of DataFrames of N rows each
+        Parms, chunk = getOption(Parms, "-chunk")
+        if chunk != None:
+            try:
+                flag_chunk = int(chunk)
+            except ValueError:
+                flag_chunk = 0
+            if flag_chunk <= 0:
+                errormsg("The -chunk option requires a positive number of rows.")
+                return
+            
+        # Run the statements of a cell on up to N connections at once
+        Parms, parallel = getOption(Parms, "-parallel")
+        if parallel != None:
+            try:
+                flag_parallel = int(parallel)
+            except ValueError:
+                flag_parallel = 0
+            if flag_parallel <= 0:
+                errormsg("The -parallel option requires a positive number of connections.")
+                return
+        
+        # Only fetch the rows added since the last run of the statement: -incremental key [window=N]. This
+        # is checked before -i which would otherwise match it.
+        incremental = re.search(r'(^|\s)-incremental\s+(\S+)(?:\s+window=(\d+))?(?=\s|$)', Parms, flags=re.I)
+        if incremental != None:
+            if incremental.group(2).upper() == "RESET":
+                incrementalResults.clear()
+                return
+            flag_incremental = {"key": incremental.group(2), "window": int(incremental.group(3) or 0)}
+            Parms = Parms[:incremental.start()] + " " + Parms[incremental.end():]
+            
+        # Run the statement on several saved connection profiles: -fanout [targets=name,name] [timeout=seconds]
+        Parms, flag_fanout = getOptionSettings(Parms, "-fanout", ["targets", "timeout"])
+        if flag_fanout != None:
+            try:
+                flag_fanout["timeout"] = float(flag_fanout.get("timeout", 60))
+            except ValueError:
+                errormsg("The -fanout timeout setting must be a number of seconds.")
+                return
+            if "targets" in flag_fanout:
+                flag_fanout["targets"] = [name.strip().upper() for name in flag_fanout["targets"].split(",") if len(name.strip()) > 0]
+        
+        # Run the statements as one transaction or commit every N statements: -tx [commit=N]
+        Parms, flag_tx = getOptionSettings(Parms, "-tx", ["commit"])
+        if flag_tx != None:
+            try:
+                flag_tx["commit"] = int(flag_tx.get("commit", 0))
+            except ValueError:
+                errormsg("The -tx commit setting must be a number of statements.")
+                return
+        
+        # Benchmark the statement with concurrent workers and return the latency percentiles
+        Parms, flag_bench = getOptionSettings(Parms, "-bench", ["workers", "runs", "duration", "warmup", "mode"])
+        if flag_bench != None:
+            try:
+                for keyword in ["workers", "runs", "warmup"]:
+                    if keyword in flag_bench: flag_bench[keyword] = int(flag_bench[keyword])
+                if "duration" in flag_bench: flag_bench["duration"] = float(flag_bench["duration"])
+            except ValueError:
+                errormsg("The -bench settings workers, runs, warmup and duration must be numbers.")
+                return
+            flag_bench["mode"] = flag_bench.get("mode", "both").lower()
+            if flag_bench["mode"] not in ["both", "prepared", "immediate"]:
+                errormsg("The -bench mode must be prepared, immediate or both.")
+                return
+        
+        # Explain the statement and return the access plan: -explain [execute=no]
+        Parms, flag_explain = getOptionSettings(Parms, "-explain", ["execute"])
+        
+        # Run the statement in the background and return a handle to it
+        if Parms.find("-bg") >= 0:
+            flag_background = True
+            Parms = Parms.replace("-bg"," ")
+            
+        # Use the result cache for this statement
+        if Parms.find("-cache") >= 0:
+            flag_cache = True
+            Parms = Parms.replace("-cache"," ")
+            
+        # Compare the native fetch engine against pandas.read_sql
+        if Parms.find("-compare") >= 0:
+            flag_compare = True
+            Parms = Parms.replace("-compare"," ")
+            
+        # Fetch all rows into a DataFrame with compact column types and report the memory saved
+        if Parms.find("-compact") >= 0:
+            flag_compact = True
+            Parms = Parms.replace("-compact"," ")
+            
         # Execute the SQL so that it behaves like a SELECT statement
         if Parms.find("-s") >= 0:
             flag_sqlType = sqlBlock
             Parms = Parms.replace("-s"," ")
             
+        # Return the results as typed column arrays: -r array
+        result_array = re.search(r'(^|\s)-r\s+array(?=\s|$)', Parms, flags=re.I)
+        if result_array != None:
+            flag_resultset = "array"
+            Parms = Parms[:result_array.start()] + " " + Parms[result_array.end():]
+            
         # Execute the SQL but return the results in an array (basically a two-dimensional array)
         if Parms.find("-r") >= 0:
             flag_resultset = True
@@ -758,6 +4382,7 @@ class DB2(Magics):
 
         # Retrieve all rows (do not use the default limit)
         if Parms.find("-a") >= 0:
+            flag_all = True
             pandas.reset_option('max_rows')
             Parms = Parms.replace("-a"," ")
           
@@ -771,24 +4396,48 @@ class DB2(Magics):
             flag_timer = True
             Parms = Parms.replace("-t"," ")
           
-        # Plot functions -pb = bar, -pp = pie, -pl = line
-        if Parms.find("-pb") >= 0:
+        # Plot functions -pb = bar, -pp = pie, -pl = line. Bar and pie charts take top=N and line charts
+        # take points=N and method=bins|lttb|none to limit how much data is plotted.
+        Parms, options = getOptionSettings(Parms, "-pb", ["top"])
+        if options != None:
             flag_plot = 1
-            Parms = Parms.replace("-pb"," ")
+            flag_plotoptions = options
           
-        if Parms.find("-pp") >= 0:
+        Parms, options = getOptionSettings(Parms, "-pp", ["top"])
+        if options != None:
             flag_plot = 2
-            Parms = Parms.replace("-pp"," ")
+            flag_plotoptions = options
                                 
-        if Parms.find("-pl") >= 0:
+        Parms, options = getOptionSettings(Parms, "-pl", ["points", "method"])
+        if options != None:
             flag_plot = 3
-            Parms = Parms.replace("-pl"," ") 
+            flag_plotoptions = options
+            
+        try:
+            for keyword in ["top", "points"]:
+                if keyword in flag_plotoptions: int(flag_plotoptions[keyword])
+        except ValueError:
+            errormsg("The plot settings top and points must be numbers.")
+            return
+        if flag_plotoptions.get("method", "bins").lower() not in ["bins", "lttb", "none"]:
+            errormsg("The plot method must be bins, lttb or none.")
+            return
             
         if Parms.find("-i") >= 0:
             flag_plot = 4
             Parms = Parms.replace("-i"," ")             
       
         remainder = Parms.strip()
+        
+        # Run the script file as it is read
+        
+        if flag_script != None:
+            try:
+                with open(os.path.expanduser(flag_script), "r") as script:
+                    return(db2_run_script(script, flag_delim, self.shell.user_ns, flag_quiet, settings["maxrows"]))
+            except (IOError, OSError) as err:
+                errormsg("Unable to read the script file " + flag_script + ": " + str(err))
+                return
                     
         # Split the line according to your delimiter
             
@@ -796,11 +4445,26 @@ class DB2(Magics):
             sqlLines = [remainder]
             flag_cell = False
         else:
-            cell = re.sub('.*?--.*$',"",cell,flags=re.M)
-            remainder = cell.replace("\n"," ")
-            sqlLines = remainder.split(flag_delim)
+            sqlLines = [sql for lineno, sql in db2_split(cell.splitlines(True), flag_delim)]
             flag_cell = True
                       
+        # Run the statements of the cell concurrently or in a transaction
+        
+        if (flag_parallel > 0 and flag_cell == True) or flag_tx != None:
+            statements = []
+            for sql in sqlLines:
+                keywords = sql.split()
+                if len(keywords) == 0: continue
+                sqlcmd = keywords[0].upper()
+                parms = []
+                if sqlcmd in bindable or flag_sqlType == sqlBlock:
+                    sql, parms = db2_bind_vars(sql, self.shell.user_ns)
+                query = (flag_sqlType == sqlBlock) or (sqlcmd in select and flag_sqlType != db2Block)
+                statements.append((sql, parms, query))
+            if flag_tx != None:
+                return(db2_transaction(statements, flag_tx["commit"], flag_quiet))
+            return(db2_parallel(statements, flag_parallel, flag_quiet))
+        
         # For each line figure out if you run it as a command (db2) or select (sql)
          
         for sql in sqlLines:
@@ -813,27 +4477,111 @@ class DB2(Magics):
             
             sqlcmd = keywords[0].upper()
             
-            if (flag_timer == True):
+            # Bind :var host variables to parameter markers
+            
+            parms = []
+            if sqlcmd in bindable or flag_sqlType == sqlBlock:
+                sql, parms = db2_bind_vars(sql, self.shell.user_ns)
+                
+            db2_stats_start(sql)
+            
+            if (flag_bench != None):
+                
+                query = (flag_sqlType == sqlBlock) or (sqlcmd in select and flag_sqlType != db2Block)
+                return(db2_benchmark(sql, parms, query, **flag_bench))
+            
+            elif (flag_incremental != None):
+                
+                try:
+                    return(db2_incremental(sql, parms, flag_incremental["key"], flag_incremental["window"], flag_quiet))
+                except Exception as err:
+                    db2_error(flag_quiet)
+                    return
+                
+            elif (flag_fanout != None):
+                
+                query = (flag_sqlType == sqlBlock) or (sqlcmd in select and flag_sqlType != db2Block)
+                try:
+                    return(db2_fanout(sql, parms, query, flag_fanout.get("targets"), flag_fanout["timeout"], flag_quiet))
+                except Exception as err:
+                    errormsg(str(err))
+                    return
+            
+            elif (flag_out != None):
+                
+                try:
+                    return(db2_export(sql, os.path.expanduser(flag_out), parms, flag_quiet))
+                except (IOError, OSError, TypeError, ValueError) as err:
+                    errormsg("Unable to write " + flag_out + ": " + str(err))
+                    return
+                except Exception as err:
+                    db2_error(flag_quiet)
+                    return
+                
+            elif (flag_explain != None):
+                
+                try:
+                    return(db2_explain(sql, parms, flag_explain.get("execute", "yes").lower() != "no", flag_quiet))
+                except Exception as err:
+                    db2_error(flag_quiet)
+                    return
+                
+            elif (flag_background == True):
+                
+                query = (flag_sqlType == sqlBlock) or (sqlcmd in select and flag_sqlType != db2Block)
+                return(db2_background(sql, parms, query))
+            
+            elif (flag_timer == True):
                     
-                count = sqlTimer(flag_sqlType, sql)
+                count = sqlTimer(flag_sqlType, sql, parms)
                  
                 if flag_quiet == False and count != -1:
                     print("Total iterations in %s second(s): %s" % (runtime,count))
                     
                 return(count)
             
+            elif (flag_compare == True):
+                
+                try:
+                    return(db2_fetch_compare(sql, parms))
+                except Exception as err:
+                    db2_error(False)
+                    return
+                
+            elif (flag_compact == True):
+                
+                try:
+                    return(db2_fetch_compact(sql, parms, flag_quiet))
+                except Exception as err:
+                    db2_error(flag_quiet)
+                    return
+            
             elif (flag_plot != 0):
                 
                 try:
-                    df = pandas.read_sql(sql,hstmt)
+                    if flag_cache == True:
+                        fetch = db2_cached_fetch
+                    else:
+                        fetch = lambda sql, parms: db2_fetch(sql, parms=parms)
+                    if flag_plot == 4:
+                        df = fetch(sql, parms)
+                    else:
+                        df = db2_plot_data(sql, parms, flag_plot, flag_plotoptions, fetch)
                 except Exception as err:
                     db2_error(False)
                     return
                 
                 if flag_plot == 4:
                     
+                    try:
+                        from pixiedust.display import display as pixiedust
+                        from pixiedust.utils.shellAccess import ShellAccess
+                    except ImportError:
+                        errormsg("The -i option needs pixiedust. Install it with !pip install pixiedust")
+                        return
+                    
                     ShellAccess.pdf = df
-                    display(pdf)
+                    pixiedust(df)
 
                     return
                 
@@ -882,39 +4630,43 @@ class DB2(Magics):
  
             elif (flag_sqlType == sqlBlock) or (sqlcmd in select and flag_sqlType != db2Block):
                 
-                if flag_json == True:
-                    try: 
-                        stmt = ibm_db.exec_immediate(hdbc,sql);
-                        row_count = 0
-                        while( ibm_db.fetch_row(stmt) ):
-                            row_count = row_count + 1
-                            jsonVal = ibm_db.result(stmt,0)
-                            formatted_JSON = json.dumps(json.loads(jsonVal), indent=4, separators=(',', ': '))
-                        
-                            # Print JSON Structure
+                if flag_json == "table":
+                    try:
+                        return(db2_json_table(sql, parms, flag_jsonpaths))
+                    except Exception as err:
+                        db2_error(flag_quiet)
                         
-                            if row_count > 1: print()
-                            print("Row: %d" % row_count)
-                            print(formatted_JSON)
-                            flag_output = True
+                elif flag_json == True:
+                    try: 
+                        maxrows = -1 if flag_all == True else settings["maxrows"]
+                        if db2_json_print(sql, parms, maxrows) > 0: flag_output = True
                 
                     except Exception as err:
                         db2_error(flag_quiet)
                     
+                elif flag_chunk > 0:
+                    try:
+                        return(db2_chunks(sql, flag_chunk, flag_resultset, parms))
+                    except Exception as err:
+                        db2_error(flag_quiet)
+                        
                 else:  
-                    if flag_resultset == True:
-                        row_count = 0
+                    if flag_resultset == "array":
+                        try:
+                            stmt = db2_exec(sql, parms)
+                            resultSet = DB2Rows.fetch(stmt)
+                            ibm_db.free_result(stmt)
+                            return(resultSet)
+                        
+                        except Exception as err:
+                                db2_error(False) 
+                                
+                    elif flag_resultset == True:
                         resultSet = []
                         try:
-                            stmt = ibm_db.exec_immediate(hdbc,sql)
-                            result = ibm_db.fetch_tuple(stmt)
-                            while (result):
-                                row = []
-                                for col in result:
-                                    row.append(col)
-                            
-                                resultSet.append(row)
-                                result = ibm_db.fetch_tuple(stmt)
+                            stmt = db2_exec(sql, parms)
+                            for batch in db2_batches(stmt):
+                                resultSet.extend([list(row) for row in batch])
                             
                             return(resultSet)                                    
                                 
@@ -924,7 +4676,12 @@ class DB2(Magics):
                     else:
                         try:
                         
-                            dp = pandas.read_sql(sql, hstmt)
+                            if flag_cache == True:
+                                dp = db2_cached_fetch(sql, parms)
+                            elif flag_all == True or settings["maxrows"] == -1:
+                                dp = db2_fetch(sql, parms=parms)
+                            else:
+                                dp = db2_preview(sql, settings["maxrows"], parms)
                             if flag_dataframe == True:
                                 return(dp)
                             else:
@@ -938,7 +4695,8 @@ class DB2(Magics):
             else:
                 
                 try: 
-                    ibm_db.exec_immediate(hdbc,sql);
+                    db2_exec(sql, parms)
+                    db2_result_cache_invalidate(sql)
                     if flag_cell == False and flag_quiet == False:
                         print("Command completed.")
                 
@@ -951,7 +4709,13 @@ class DB2(Magics):
 # Register the Magic extension in Jupyter    
 ip = get_ipython()          
 ip.register_magics(DB2)
+for callback in list(ip.events.callbacks["post_run_cell"]):
+    if getattr(callback, "__name__", "") in ["db2_stats_finish", "db2_history_save"]: 
+        ip.events.unregister("post_run_cell", callback)
+ip.events.register("post_run_cell", db2_stats_finish)
+ip.events.register("post_run_cell", db2_history_save)
 load_settings()
+importTimes["DB2 Extensions"] = time.time() - loadStart
 success("DB2 Extensions Loaded.")
 
 